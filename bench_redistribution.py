@@ -0,0 +1,116 @@
+"""
+Benchmark the interpolation engines in redistribution.create_matrix against
+the original 200-pass float64 diffusion: wall time and deviation of the final
+1..5 surface. The deviation is the accuracy given up for the speed: idw and
+nearest fill gaps differently from the diffusion (MAE around 1.2-1.35 on the
+real grid), so they suit previews, not the published heatmap.
+
+    python bench_redistribution.py [--spread K] [--tol T] [--max-deviation D]
+
+The surface_operator operators must reproduce their engines' raw surfaces,
+the active-tile diffusion must match the reference exactly, and the tol run
+must stop early (fewer than the 200 passes) and stay within
+--max-deviation of the reference on the 1..5 scale, or the benchmark fails.
+
+--spread K pushes every station K times further from the centroid, which
+grows the grid roughly K^2-fold (K=20 is about the 3000x6000 NSW-wide grid).
+The active-tile diffusion only pays off once the stations' reach no longer
+covers the grid: about x1.0 up to K=8, x2.1 at K=20 (41s against 87s).
+"""
+import argparse
+import contextlib
+import io
+import time
+import numpy as np
+
+import redistribution as rd
+import surface_operator as so
+
+
+def spread_stations(json_data, k):
+    if k == 1:
+        return json_data
+    lat0 = np.mean([v['latitude'] for v in json_data.values()])
+    lon0 = np.mean([v['longitude'] for v in json_data.values()])
+    return {
+        name: dict(v, latitude=lat0 + (v['latitude'] - lat0) * k,
+                   longitude=lon0 + (v['longitude'] - lon0) * k)
+        for name, v in json_data.items()
+    }
+
+
+def timed_matrix(json_data, layout, **kwargs):
+    # create_matrix prints a preview; keep the benchmark output readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        t0 = time.perf_counter()
+        matrix = rd.create_matrix(json_data, *layout, **kwargs)
+    return time.perf_counter() - t0, matrix
+
+
+def deviation(reference, other):
+    either = (reference > 0) | (other > 0)
+    diff = np.abs(reference[either] - other[either])
+    return {
+        'mae': float(diff.mean()) if diff.size else 0.0,
+        'max': float(diff.max()) if diff.size else 0.0,
+        'coverage': float((other > 0).sum() / max((reference > 0).sum(), 1)),
+    }
+
+
+def check_early_stop(json_data, layout, tol, max_deviation):
+    """The tol early stop must fire and keep the rescaled surface within max_deviation of the full run."""
+    rows, cols, values = rd.station_seeds(json_data, layout[:2], *layout[2:])
+    seeds = np.zeros(layout[:2])
+    seeds[rows, cols] = values
+    full, n_full = rd.diffuse_passes(seeds)
+    early, n_early = rd.diffuse_passes(seeds, tol=tol)
+    dev = deviation(rd.rescale_to_range(full), rd.rescale_to_range(early))
+    assert n_early < n_full, f"tol={tol:g} never stopped early ({n_early} passes)"
+    assert dev['max'] <= max_deviation, f"tol={tol:g} moved the surface by {dev['max']:.4f} > {max_deviation}"
+    return n_early, n_full
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--spread', type=float, default=1.0)
+    ap.add_argument('--tol', type=float, default=2e-3,
+                    help='early-stop tolerance for the diffusion run, relative to the largest value')
+    ap.add_argument('--max-deviation', type=float, default=0.5,
+                    help='largest 1..5 difference the tol run may show against the reference')
+    args = ap.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        json_data = spread_stations(rd.unpack_json(), args.spread)
+        layout = rd.grid_layout(json_data)
+    print(f"grid {layout[0]} x {layout[1]}, {len(json_data)} stations")
+
+    t_ref, reference = timed_matrix(json_data, layout, engine='diffusion', dtype=np.float64)
+    print(f"{'diffusion (200 passes)':28s} {t_ref:8.2f}s  reference, float64")
+
+    for engine in so.OPERATOR_ENGINES:
+        err = so.max_operator_error(json_data, *layout, engine=engine)
+        assert err < 1e-9, f"surface_operator {engine} operator differs from the engine by {err:.3g}"
+    print(f"surface_operator matches {', '.join(so.OPERATOR_ENGINES)} to 1e-9")
+
+    t, matrix = timed_matrix(json_data, layout, engine='diffusion', dtype=np.float64, active=True)
+    assert np.array_equal(reference, matrix), "active-tile diffusion differs from the reference"
+    print(f"{'diffusion active':28s} {t:8.2f}s  x{t_ref / max(t, 1e-9):6.1f}  identical")
+
+    n_early, n_full = check_early_stop(json_data, layout, args.tol, args.max_deviation)
+    print(f"tol={args.tol:g} stops after {n_early} of {n_full} passes")
+
+    runs = [
+        ('diffusion float32 output', dict(engine='diffusion', dtype=np.float32)),
+        (f'diffusion tol={args.tol:g}', dict(engine='diffusion', tol=args.tol)),
+        ('idw', dict(engine='idw')),
+        ('nearest', dict(engine='nearest')),
+    ]
+    for label, kwargs in runs:
+        t, matrix = timed_matrix(json_data, layout, **kwargs)
+        dev = deviation(reference, matrix)
+        print(f"{label:28s} {t:8.2f}s  x{t_ref / max(t, 1e-9):6.1f}  "
+              f"MAE={dev['mae']:.4f}  max|d|={dev['max']:.4f}  coverage={dev['coverage']:.2f}")
+
+
+if __name__ == '__main__':
+    main()
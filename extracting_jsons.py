@@ -1,6 +1,119 @@
+import os
 import sys
 import json
 
+import numpy as np
+
+# sidecar and columnar layouts written by riskscoring/export.py
+from riskscoring.formats import COLUMNAR_SCHEMA, COLUMNAR_SUFFIX, COLUMNAR_VERSION, SUMMARY_SUFFIX
+
+
+def columnar_path(risk_path):
+    return risk_path[:-len(".json")] + COLUMNAR_SUFFIX
+
+
+def summary_path(risk_path):
+    return risk_path[:-len(".json")] + SUMMARY_SUFFIX
+
+
+def load_columnar(path):
+    """
+    A *_risk.cols.json file as {column: numpy array}, plus 'date' as
+    datetime64[D]. Hoisted constants come back as scalars, not repeated
+    arrays; no per-row objects are built.
+    """
+    with open(path, "r") as f:
+        doc = json.load(f)
+    if doc.get("schema") != COLUMNAR_SCHEMA or doc.get("version") != COLUMNAR_VERSION:
+        raise ValueError(f"{path}: unsupported schema {doc.get('schema')!r} v{doc.get('version')}")
+
+    data = dict(doc["constants"])
+    data["date"] = np.datetime64(doc["start_date"], "D") + np.asarray(doc["day_offset"], dtype="timedelta64[D]")
+    for name, values in doc["columns"].items():
+        # numeric columns may hold nulls (missing indicators), which float arrays keep as NaN
+        data[name] = np.asarray(values, dtype=None if name in ("station_name", "risk_class") else float)
+    return data
+
+
+def read_summary(risk_path):
+    """The *_risk.summary.json sidecar of risk_path, or None if missing or stale (file size differs)."""
+    path = summary_path(risk_path)
+    if not os.path.exists(path) or not os.path.exists(risk_path):
+        return None
+    with open(path, "r") as f:
+        summary = json.load(f)
+    if summary.get("file_size") != os.path.getsize(risk_path):
+        return None
+    return summary
+
+
+def tail_records(risk_path, n, block=16384):
+    """
+    The last n records of a records-oriented JSON array, read backwards from
+    the end of the file in growing blocks instead of parsing the whole array.
+    Records are flat objects, so any '{' starts one.
+    """
+    decoder = json.JSONDecoder()
+    with open(risk_path, "rb") as f:
+        size = f.seek(0, os.SEEK_END)
+        while True:
+            start = max(size - block, 0)
+            f.seek(start)
+            # to_json escapes non-ASCII, so latin-1 maps bytes to chars one to one
+            text = f.read().decode("latin-1")
+
+            # skip the (possibly cut) record at the front of the block
+            pos = text.find("{", 0 if start == 0 else text.find(",{") + 1)
+            records = []
+            while pos != -1:
+                record, end = decoder.raw_decode(text, pos)
+                records.append(record)
+                pos = text.find("{", end)
+
+            if len(records) >= n or start == 0:
+                return records[-n:] if n else []
+            block *= 2
+
+
+def columnar_is_current(risk_path):
+    """True when the columnar file exists and is at least as new as the records file."""
+    cols = columnar_path(risk_path)
+    return os.path.exists(cols) and (not os.path.exists(risk_path)
+                                     or os.path.getmtime(cols) >= os.path.getmtime(risk_path))
+
+
+def risk_history(risk_path):
+    """
+    (dates as datetime64[D], risk_class) for every row of a station's output,
+    from the columnar file when current, else a full read of the records file.
+    """
+    if columnar_is_current(risk_path):
+        data = load_columnar(columnar_path(risk_path))
+        return data["date"], np.asarray(data["risk_class"])
+    with open(risk_path, "r") as f:
+        records = json.load(f)
+    dates = np.array([r["date"][:10] for r in records], dtype="datetime64[D]")
+    return dates, np.array([r["risk_class"] for r in records])
+
+
+def latest_risk_classes(risk_path, n=4):
+    """
+    risk_class of the last n records: from the records sidecar when it is
+    current and at least as new as the columnar file (export writes the
+    columnar file first), else the columnar file when it is at least as new
+    as the records file, else a tail read of the records file.
+    """
+    summary = read_summary(risk_path)
+    cols = columnar_path(risk_path)
+    if (summary is not None and len(summary["latest"]) >= min(n, summary["rows"])
+            and (not os.path.exists(cols) or os.path.getmtime(summary_path(risk_path)) >= os.path.getmtime(cols))):
+        return [r["risk_class"] for r in summary["latest"][-n:]] if n else []
+
+    if columnar_is_current(risk_path):
+        return load_columnar(cols)["risk_class"][-n:].tolist() if n else []
+    return [r["risk_class"] for r in tail_records(risk_path, n)]
+
+
 def start():
     file_list = [
         "Abbotsford_risk.json",
@@ -39,13 +152,7 @@ def start():
         station_info = json.load(f)
 
     for file_name in file_list:
-        with open(f"public/data/out/{file_name}", "r") as f:
-            json_data = json.load(f)
-
-        cum_risk = 0
-
-        for item in json_data[-4:]:
-            cum_risk += item["risk_class"]
+        cum_risk = sum(latest_risk_classes(f"public/data/out/{file_name}", 4))
 
         station_info[file_name[:-10]]["mean_risk"] = round(cum_risk / 4, 5)
 
@@ -0,0 +1,158 @@
+"""
+Export the redistribution risk surface as an XYZ tile pyramid.
+
+    python heatmap_tiles.py OUT_DIR [--format png|npy] [--tile 256] [--workers N]
+
+Zoom 0 is the coarsest level, where the whole grid fits in one tile; each
+further level doubles the resolution up to the full grid. Tiles are written
+to OUT_DIR/{z}/{x}/{y}.png (or .npy for raw float tiles) next to a
+manifest.json describing the levels, so a viewer can fetch only the tiles in
+view instead of one full-size PNG.
+
+Tiles use the same orientation as plot_heatmap (flipped vertically, then
+rotated 90° anticlockwise), with y counting down from the top row.
+"""
+import argparse
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from matplotlib import colormaps
+from matplotlib.colors import Normalize
+from matplotlib.image import imsave
+
+MANIFEST_NAME = "manifest.json"
+
+
+def display_orientation(matrix):
+    """The grid as plot_heatmap draws it: flipud, then rot90 anticlockwise."""
+    return np.rot90(np.flipud(matrix), k=1)
+
+
+def downsample(level):
+    """
+    Halve a level with 2x2 block means over non-zero cells only, so 0 keeps
+    meaning "no surface" and coastlines do not fade towards 0 when zoomed out.
+    Odd edges are padded with zeros.
+    """
+    rows, cols = level.shape
+    padded = np.zeros((rows + rows % 2, cols + cols % 2), dtype=level.dtype)
+    padded[:rows, :cols] = level
+    blocks = padded.reshape(padded.shape[0] // 2, 2, padded.shape[1] // 2, 2)
+
+    total = blocks.sum(axis=(1, 3))
+    count = (blocks > 0).sum(axis=(1, 3))
+    return np.divide(total, count, out=np.zeros_like(total), where=count > 0)
+
+
+def build_levels(matrix, tile=256):
+    """Return [zoom 0, ..., max zoom]; the last entry is the full-resolution grid."""
+    max_zoom = max(0, int(math.ceil(math.log2(max(matrix.shape) / tile))))
+    levels = [matrix]
+    for _ in range(max_zoom):
+        levels.append(downsample(levels[-1]))
+    return levels[::-1]
+
+
+def write_level(job):
+    """Write every non-empty tile of one zoom level; returns (zoom, tiles written)."""
+    z, level, out_dir, tile, fmt, cmap, vmin, vmax = job
+    rows, cols = level.shape
+    norm = Normalize(vmin=vmin, vmax=vmax)
+    colormap = colormaps[cmap]
+    written = 0
+
+    for y in range(int(math.ceil(rows / tile))):
+        for x in range(int(math.ceil(cols / tile))):
+            block = np.zeros((tile, tile), dtype=np.float32)
+            part = level[y * tile:(y + 1) * tile, x * tile:(x + 1) * tile]
+            block[:part.shape[0], :part.shape[1]] = part
+            if not np.any(block > 0):
+                continue
+
+            tile_dir = os.path.join(out_dir, str(z), str(x))
+            os.makedirs(tile_dir, exist_ok=True)
+            if fmt == "npy":
+                np.save(os.path.join(tile_dir, f"{y}.npy"), block)
+            else:
+                rgba = colormap(norm(block))
+                rgba[..., 3] = block > 0  # cells without a surface stay transparent
+                imsave(os.path.join(tile_dir, f"{y}.png"), rgba)
+            written += 1
+
+    return z, written
+
+
+def export_tile_pyramid(matrix, out_dir, tile=256, fmt="png", cmap="viridis",
+                        vmin=1.0, vmax=5.0, workers=1):
+    """
+    Write matrix (a create_matrix surface) as an XYZ pyramid under out_dir
+    and return the manifest. PNG tiles are colour-mapped over vmin..vmax,
+    which is fixed across levels so colours stay comparable when zooming;
+    npy tiles keep the raw float32 values. Levels are written in parallel
+    when workers > 1. Tiles with no surface are not written.
+    """
+    if fmt not in ("png", "npy"):
+        raise ValueError(f"unknown tile format {fmt!r}")
+
+    levels = build_levels(np.asarray(display_orientation(matrix), dtype=np.float32), tile)
+    os.makedirs(out_dir, exist_ok=True)
+
+    jobs = [(z, level, out_dir, tile, fmt, cmap, vmin, vmax) for z, level in enumerate(levels)]
+    if workers > 1:
+        # largest level first so it is not the last one left running
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            counts = dict(pool.map(write_level, jobs[::-1]))
+    else:
+        counts = dict(map(write_level, jobs))
+
+    manifest = {
+        "format": fmt,
+        "tile_size": tile,
+        "min_zoom": 0,
+        "max_zoom": len(levels) - 1,
+        "width": int(levels[-1].shape[1]),
+        "height": int(levels[-1].shape[0]),
+        "value_range": [vmin, vmax],
+        "colormap": cmap if fmt == "png" else None,
+        "path": "{z}/{x}/{y}." + fmt,
+        "levels": [
+            {
+                "zoom": z,
+                "width": int(level.shape[1]),
+                "height": int(level.shape[0]),
+                "tiles_x": int(math.ceil(level.shape[1] / tile)),
+                "tiles_y": int(math.ceil(level.shape[0] / tile)),
+                "tiles_written": counts[z],
+            }
+            for z, level in enumerate(levels)
+        ],
+    }
+    with open(os.path.join(out_dir, MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    return manifest
+
+
+def main():
+    import redistribution as rd
+
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("out_dir")
+    ap.add_argument("--format", choices=("png", "npy"), default="png")
+    ap.add_argument("--tile", type=int, default=256)
+    ap.add_argument("--engine", default="diffusion", choices=sorted(rd.INTERPOLATION_ENGINES))
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = ap.parse_args()
+
+    json_data = rd.unpack_json()
+    matrix = rd.create_matrix(json_data, *rd.grid_layout(json_data), engine=args.engine)
+    manifest = export_tile_pyramid(matrix, args.out_dir, tile=args.tile, fmt=args.format, workers=args.workers)
+    print(f"zoom 0..{manifest['max_zoom']}, "
+          f"{sum(level['tiles_written'] for level in manifest['levels'])} tiles -> {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,16 @@
 import json
 import math
+from functools import lru_cache
 import numpy as np
 from scipy.signal import convolve2d
 from scipy.spatial import cKDTree
 from scipy import ndimage
-import matplotlib.pyplot as plt
 from scipy.interpolate import griddata
 from scipy.ndimage import gaussian_filter, uniform_filter, maximum_filter, distance_transform_edt, label, convolve
 from scipy.spatial.distance import cdist
 
 from extracting_jsons import start
+from station_registry import StationRegistry
 
 def unpack_json():
     return start()
@@ -17,28 +18,8 @@ def unpack_json():
     #     data = json.load(f)
     # return data
 
-def get_min_max_coordinate(json_data, variable):
-    max_value = 0
-    min_value = 10000
-
-    first = True
-
-    for name in json_data:
-        if first:
-            max_value = json_data[name][variable]
-            min_value = json_data[name][variable]
-            first = False
-            continue
-
-        max_value = max(max_value, json_data[name][variable])
-        min_value = min(min_value, json_data[name][variable])
-
-    print(f"{int((min_value * 300)) = }, {int((max_value * 300)) = }")
-    return min_value, max_value
-
 def get_coord_range(json_data):
-    min_lat, max_lat = get_min_max_coordinate(json_data, 'latitude')
-    min_lon, max_lon = get_min_max_coordinate(json_data, 'longitude')
+    min_lat, max_lat, min_lon, max_lon = StationRegistry.of(json_data).bounds
 
     lat_range = int((max_lat * 300) - (min_lat * 300))
     lon_range = int((max_lon * 300) - (min_lon * 300))
@@ -54,22 +35,249 @@ def get_buffer(coord_lat, coord_lon, list_lat, list_lon):
     left_buffer = max(2, int(math.floor((list_lon - coord_lon) / 2)))
     return top_buffer, left_buffer
 
-def create_matrix(json_data, N, M, left_buffer, top_buffer):
-    matrix = np.zeros((N, M), dtype=np.float64)
-    matrix = place_existing_info(json_data, matrix, left_buffer, top_buffer)
+def grid_layout(json_data):
+    """
+    Matrix shape and buffers for a station set: (N, M, left_buffer, top_buffer)
+    as passed to create_matrix.
+    """
+    coord_lat_range, coord_lon_range = get_coord_range(json_data)
+    list_lat_size, list_lon_size = get_list_range(coord_lat_range, coord_lon_range)
+    left_buffer, top_buffer = get_buffer(coord_lat_range, coord_lon_range, list_lat_size, list_lon_size)
+    return list_lon_size, list_lat_size, left_buffer, top_buffer
+
+def create_matrix(json_data, N, M, left_buffer, top_buffer, engine="diffusion", dtype=np.float64, **engine_kwargs):
+    """
+    Build the risk surface: place station values, fill the gaps with an
+    interpolation engine (see INTERPOLATION_ENGINES), rescale to 1..5.
 
-    for i in range(100):
-        matrix = estimate_unknown_regions(matrix)
+    The engines always run in float64: the first diffusion kernel is not
+    normalised and its values span far more than float32's range. dtype only
+    sets the returned surface's type; float32 halves its memory at the cost
+    of rounding the final 1..5 values.
+    """
+    rows, cols, values = station_seeds(json_data, (N, M), left_buffer, top_buffer)
+    matrix = np.zeros((N, M), dtype=np.float64)
+    matrix[rows, cols] = values
 
-    for i in range(100):
-        matrix = estimate_unknown_regions2(matrix)
+    matrix = INTERPOLATION_ENGINES[engine](matrix, **engine_kwargs)
 
-    matrix = rescale_to_range(matrix)
+    matrix = rescale_to_range(matrix).astype(dtype, copy=False)
 
     print_matrix(matrix)
     return matrix
 
 
+def diffuse(matrix, iterations=100, iterations2=100, tol=None, active=False):
+    """
+    The original two-phase diffusion: `iterations` passes of
+    estimate_unknown_regions then `iterations2` of estimate_unknown_regions2.
+    With `tol`, a phase stops early once a pass moves no cell by more than
+    tol relative to the largest value (see diffuse_passes).
+    With `active`, each pass only visits the tiles that can still change
+    (see diffuse_active); the result is identical.
+    """
+    return (diffuse_active if active else diffuse_passes)(matrix, iterations, iterations2, tol)[0]
+
+
+def diffuse_passes(matrix, iterations=100, iterations2=100, tol=None):
+    """
+    diffuse, also returning the number of passes run.
+
+    The first kernel is not normalised and grows values ~4x per pass (to ~1e58),
+    so the early stop is relative: max|change| <= tol * max|matrix|, i.e. tol
+    is a fraction of the surface's top value, about tol * 4 on the final 1..5
+    scale, and once no new cell has been reached. In practice only the
+    second, normalised phase settles; the first keeps reshaping the surface
+    until its last pass.
+    Works on a float64 copy, reusing one set of buffers throughout.
+    """
+    matrix = np.array(matrix, dtype=np.float64, copy=True)
+    buffers = diffusion_buffers(matrix.shape)
+    previous = np.empty_like(matrix) if tol is not None else None
+    passes = 0
+
+    for step, n_iter in ((estimate_unknown_regions, iterations), (estimate_unknown_regions2, iterations2)):
+        for i in range(n_iter):
+            if previous is not None:
+                np.copyto(previous, matrix)
+            step(matrix, buffers=buffers)
+            passes += 1
+            converged = False
+            if previous is not None:
+                change = buffers['blend']
+                np.subtract(matrix, previous, out=change)
+                # a cell going from 0 to positive jumps to >= 1 after rescaling, so the
+                # surface must also have stopped spreading
+                converged = (np.max(np.abs(change, out=change)) <= tol * np.max(np.abs(matrix))
+                             and np.count_nonzero(matrix) == np.count_nonzero(previous))
+            if converged:
+                break
+
+    return matrix, passes
+
+
+def diffuse_active(matrix, iterations=100, iterations2=100, tol=None, tile=64, dense_fraction=0.5):
+    """
+    diffuse_passes, visiting only the tiles that can change: the same
+    (matrix, passes), bit for bit.
+
+    Both kernels compute a cell from its 3x3 neighbourhood alone, so a pass
+    can only change a cell next to one the previous pass changed, and a cell
+    whose neighbourhood is all zero stays zero. The grid is cut into
+    tile x tile cores (tile_windows); each pass runs the kernel on the cores
+    next to a core that changed last pass, each read with a one-cell ring of
+    real values so every core cell sees its full-grid neighbourhood, and
+    writes them back once all are computed. Stations far apart keep separate
+    active regions instead of one box spanning the grid. Once more than
+    dense_fraction of the tiles are active, a pass runs on the whole grid,
+    which is cheaper than that many windows.
+    """
+    matrix = np.array(matrix, dtype=np.float64, copy=True)
+    shape = matrix.shape
+    tiles = list(tile_windows(shape, tile, 1))
+    grid = (-(-shape[0] // tile), -(-shape[1] // tile))   # tiles per axis, row-major like tile_windows
+    starts = (np.arange(0, shape[0], tile), np.arange(0, shape[1], tile))
+
+    def per_tile(reduce, arr):
+        return reduce.reduceat(reduce.reduceat(arr, starts[0], axis=0), starts[1], axis=1).ravel()
+
+    full_buffers = diffusion_buffers(shape)
+    buffers = {name: buf[:min(tile, shape[0]) + 2, :min(tile, shape[1]) + 2] for name, buf in full_buffers.items()}
+    scratch = np.empty(shape)
+    tile_nonzero = per_tile(np.add, (matrix != 0).astype(np.intp))
+    tile_max = per_tile(np.maximum, np.abs(matrix)) if tol is not None else None
+    passes = 0
+
+    for step, n_iter in ((estimate_unknown_regions, iterations), (estimate_unknown_regions2, iterations2)):
+        # a phase can change any cell with a non-zero neighbourhood
+        changed = tile_nonzero > 0
+        for i in range(n_iter):
+            todo = np.flatnonzero(maximum_filter(changed.reshape(grid), size=3, mode='constant', cval=False))
+            if todo.size == 0:
+                # nothing can move any more; count the remaining passes as diffuse_passes would
+                passes += 1 if tol is not None else n_iter - i
+                break
+            nonzero_before = int(tile_nonzero.sum())
+            passes += 1
+
+            if todo.size > dense_fraction * len(tiles):
+                previous = scratch
+                np.copyto(previous, matrix)
+                step(matrix, buffers=full_buffers)
+                diff = full_buffers['mask']
+                np.not_equal(matrix, previous, out=diff)
+                changed = per_tile(np.logical_or, diff)
+                tile_nonzero = per_tile(np.add, (matrix != 0).astype(np.intp))
+                if tol is not None:
+                    max_change = np.max(np.abs(matrix - previous))
+                    tile_max = per_tile(np.maximum, np.abs(matrix))
+            else:
+                results = []
+                for t in todo:
+                    core, window = tiles[t]
+                    h, w = window[0].stop - window[0].start, window[1].stop - window[1].start
+                    local = scratch[:h, :w]
+                    np.copyto(local, matrix[window])
+                    step(local, buffers={name: buf[:h, :w] for name, buf in buffers.items()})
+                    inner = (slice(core[0].start - window[0].start, core[0].stop - window[0].start),
+                             slice(core[1].start - window[1].start, core[1].stop - window[1].start))
+                    results.append((t, local[inner].copy()))
+
+                changed = np.zeros(len(tiles), dtype=bool)
+                max_change = 0.0
+                for t, new in results:
+                    core = tiles[t][0]
+                    if np.array_equal(new, matrix[core]):
+                        continue
+                    changed[t] = True
+                    if tol is not None:
+                        max_change = max(max_change, np.max(np.abs(new - matrix[core])))
+                        tile_max[t] = np.max(np.abs(new))
+                    tile_nonzero[t] = np.count_nonzero(new)
+                    matrix[core] = new
+
+            if (tol is not None and max_change <= tol * tile_max.max()
+                    and int(tile_nonzero.sum()) == nonzero_before):
+                break
+
+    return matrix, passes
+
+
+def seed_cells(matrix):
+    rows, cols = np.nonzero(matrix > 0)
+    return np.column_stack([rows, cols]), matrix[rows, cols]
+
+
+def idw_surface(matrix, power=2, k=8, max_distance=200, chunk_rows=256):
+    """
+    One-pass inverse distance weighting from the seeded cells via cKDTree.
+    Cells further than max_distance (in cells) from every seed stay 0,
+    mirroring how far 200 diffusion passes can spread.
+    """
+    seeds, values = seed_cells(matrix)
+    if len(values) == 0:
+        return matrix.copy()
+
+    tree = cKDTree(seeds)
+    k = min(k, len(values))
+    n_rows, n_cols = matrix.shape
+    result = np.zeros(matrix.shape, dtype=matrix.dtype)
+    cols = np.arange(n_cols)
+    upper = np.inf if max_distance is None else max_distance
+
+    # query in row bands to keep the (cells x k) temporaries small
+    for r0 in range(0, n_rows, chunk_rows):
+        r1 = min(r0 + chunk_rows, n_rows)
+        rr, cc = np.meshgrid(np.arange(r0, r1), cols, indexing='ij')
+        dist, idx = tree.query(np.column_stack([rr.ravel(), cc.ravel()]), k=k, distance_upper_bound=upper)
+        dist = dist.reshape(-1, k)
+        idx = idx.reshape(-1, k)
+
+        found = np.isfinite(dist)
+        safe_idx = np.where(found, idx, 0)
+        with np.errstate(divide='ignore'):
+            weights = np.where(found, 1.0 / dist ** power, 0.0)
+        exact = found & (dist == 0)
+        weights = np.where(exact.any(axis=1, keepdims=True), exact.astype(np.float64), weights)
+
+        total = weights.sum(axis=1)
+        band = np.divide((weights * values[safe_idx]).sum(axis=1), total,
+                         out=np.zeros_like(total), where=total > 0)
+        result[r0:r1] = band.reshape(r1 - r0, n_cols)
+
+    return result
+
+
+def nearest_surface(matrix, decay=1.0, max_distance=200):
+    """
+    Distance-transform fill: every cell takes its nearest seed's value
+    (optionally decayed by decay ** distance), 0 beyond max_distance.
+    """
+    mask = matrix > 0
+    if not np.any(mask):
+        return matrix.copy()
+
+    dist, (inds_r, inds_c) = distance_transform_edt(~mask, return_indices=True)
+    result = matrix[inds_r, inds_c]
+    if decay != 1.0:
+        result *= decay ** dist
+    if max_distance is not None:
+        result[dist > max_distance] = 0
+
+    return result
+
+
+# "diffusion" is the reference surface. idw and nearest are much faster but are
+# not drop-in replacements: on the real grid they differ from it by a mean of
+# about 1.2 (idw) and 1.35 (nearest) on the 1..5 scale, up to ~3.9 in places
+# (see bench_redistribution.py).
+INTERPOLATION_ENGINES = {
+    "diffusion": diffuse,
+    "idw": idw_surface,
+    "nearest": nearest_surface,
+}
+
+
 def coord_to_index(coord, min_coord, buffer):
     coord = int(abs(coord) * 300)
     min_coord = int(abs(min_coord) * 300)
@@ -77,19 +285,170 @@ def coord_to_index(coord, min_coord, buffer):
     return coord - min_coord + buffer
 
 def place_existing_info(json_data, matrix, left_buffer, top_buffer):
-    max_lat = get_min_max_coordinate(json_data, 'latitude')[1]
-    min_lon = get_min_max_coordinate(json_data, 'longitude')[0]
+    rows, cols, values = station_seeds(json_data, matrix.shape, left_buffer, top_buffer)
+    matrix[rows, cols] = values
+    return matrix
+
 
-    for name in json_data:
-        i = coord_to_index(json_data[name]['latitude'], max_lat, top_buffer)
-        j = coord_to_index(json_data[name]['longitude'], min_lon, left_buffer)
-        mean_risk = json_data[name]['mean_risk']
+def station_cells(json_data, shape, left_buffer, top_buffer):
+    """
+    Grid cell of every placed station as (names, rows, cols), with the same
+    indexing as place_existing_info: negative indices wrap, out-of-range
+    stations are skipped, a later station wins a shared cell.
+    Only coordinates are read, so json_data may also be a StationRegistry.
+    """
+    registry = StationRegistry.of(json_data)
+    j, i = registry.grid_indices(left_buffer, top_buffer)
+    inside = (-shape[0] <= j) & (j < shape[0]) & (-shape[1] <= i) & (i < shape[1])
 
-        try:
-            matrix[j, i] = mean_risk
-        except IndexError:
-            continue
+    cells = {}
+    for k in np.flatnonzero(inside):
+        cells[(int(j[k]) % shape[0], int(i[k]) % shape[1])] = registry.names[k]
 
+    rows = np.array([rc[0] for rc in cells], dtype=np.intp)
+    cols = np.array([rc[1] for rc in cells], dtype=np.intp)
+    return list(cells.values()), rows, cols
+
+
+def station_seeds(json_data, shape, left_buffer, top_buffer):
+    """
+    Station cells as coordinate arrays (rows, cols, values) instead of a dense
+    matrix; see station_cells for the placement rules.
+    """
+    names, rows, cols = station_cells(json_data, shape, left_buffer, top_buffer)
+    values = np.array([json_data[name]['mean_risk'] for name in names], dtype=np.float64)
+    return rows, cols, values
+
+
+# --------- tiled surface computation ---------
+
+def engine_halo(engine="diffusion", **engine_kwargs):
+    """
+    How far (in cells) a seed can influence the surface for an engine: the
+    diffusion spreads one cell per pass, idw/nearest stop at max_distance.
+    """
+    if engine == "diffusion":
+        return engine_kwargs.get("iterations", 100) + engine_kwargs.get("iterations2", 100)
+    max_distance = engine_kwargs.get("max_distance", 200)
+    if max_distance is None:
+        raise ValueError(f"engine {engine!r} needs a finite max_distance to be tiled")
+    return int(math.ceil(max_distance))
+
+
+def tile_windows(shape, tile, halo):
+    """Yield (core, window) slice pairs covering the grid in tile x tile cores."""
+    n_rows, n_cols = shape
+    for r0 in range(0, n_rows, tile):
+        for c0 in range(0, n_cols, tile):
+            r1, c1 = min(r0 + tile, n_rows), min(c0 + tile, n_cols)
+            core = (slice(r0, r1), slice(c0, c1))
+            window = (slice(max(r0 - halo, 0), min(r1 + halo, n_rows)),
+                      slice(max(c0 - halo, 0), min(c1 + halo, n_cols)))
+            yield core, window
+
+
+def compute_tile(job):
+    """
+    Run the engine on one haloed window seeded only with its own stations and
+    return the core. Outside the real grid edge the window sees zeros, exactly
+    like mode='constant' on the full grid, so cores match the untiled result.
+    """
+    core, window, rows, cols, values, engine, engine_kwargs = job
+    # engines run in float64 (see create_matrix); the core is stored as dtype by the caller
+    local = np.zeros((window[0].stop - window[0].start, window[1].stop - window[1].start), dtype=np.float64)
+    local[rows - window[0].start, cols - window[1].start] = values
+    surface = INTERPOLATION_ENGINES[engine](local, **engine_kwargs)
+    return core, surface[core[0].start - window[0].start:core[0].stop - window[0].start,
+                         core[1].start - window[1].start:core[1].stop - window[1].start]
+
+
+def rescale_block(block, current_min, current_max, target_min=1.0, target_max=5.0):
+    """rescale_to_range for one block, given the global min/max of non-zero values."""
+    mask = block > 0
+    if current_max <= current_min:
+        block[mask] = target_min
+    else:
+        block[mask] = target_min + (block[mask] - current_min) * (target_max - target_min) / (current_max - current_min)
+    return block
+
+
+def create_matrix_tiled(json_data, N, M, left_buffer, top_buffer, engine="diffusion", dtype=np.float64,
+                        tile=1024, halo=None, workers=1, out_path=None, **engine_kwargs):
+    """
+    create_matrix computed in independent overlapping tiles.
+
+    Each tile is extended by a halo of engine_halo() cells, so its core equals
+    the untiled surface. Exceptions: the diffusion's tol early stop converges
+    per tile, and idw may pick a different one of several equidistant k-th
+    nearest seeds. Tiles with no station within reach are skipped. Peak
+    working memory is one (tile + 2 * halo)^2 window per worker; with out_path
+    the result is an .npy memmap, so the full grid never has to fit in RAM.
+
+    Tiles are computed in float64 and, as in create_matrix, dtype only applies
+    to the rescaled result: with a narrower dtype the raw tiles are staged in
+    float64 (a scratch .npy next to out_path) until the global min/max is known.
+    """
+    import os
+    from concurrent.futures import ProcessPoolExecutor
+
+    if halo is None:
+        halo = engine_halo(engine, **engine_kwargs)
+    rows, cols, values = station_seeds(json_data, (N, M), left_buffer, top_buffer)
+
+    if out_path is not None:
+        matrix = np.lib.format.open_memmap(out_path, mode='w+', dtype=dtype, shape=(N, M))
+        matrix[:] = 0
+    else:
+        matrix = np.zeros((N, M), dtype=dtype)
+    staged = np.dtype(dtype) != np.float64
+    raw_path = f"{out_path}.raw.npy" if staged and out_path is not None else None
+    if not staged:
+        raw = matrix
+    elif raw_path is not None:
+        raw = np.lib.format.open_memmap(raw_path, mode='w+', dtype=np.float64, shape=(N, M))
+        raw[:] = 0
+    else:
+        raw = np.zeros((N, M))
+
+    def jobs():
+        for core, window in tile_windows((N, M), tile, halo):
+            inside = ((rows >= window[0].start) & (rows < window[0].stop) &
+                      (cols >= window[1].start) & (cols < window[1].stop))
+            if inside.any():
+                yield core, window, rows[inside], cols[inside], values[inside], engine, engine_kwargs
+
+    current_min, current_max = np.inf, -np.inf
+
+    def collect(results):
+        nonlocal current_min, current_max
+        for core, block in results:
+            raw[core] = block
+            positive = block[block > 0]
+            if positive.size:
+                current_min = min(current_min, positive.min())
+                current_max = max(current_max, positive.max())
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            collect(pool.map(compute_tile, jobs()))
+    else:
+        collect(map(compute_tile, jobs()))
+
+    # second pass: global rescale to 1..5, tile by tile
+    if np.isfinite(current_min):
+        for core, _ in tile_windows((N, M), tile, 0):
+            matrix[core] = rescale_block(np.array(raw[core]), current_min, current_max)
+    elif staged:
+        for core, _ in tile_windows((N, M), tile, 0):
+            matrix[core] = raw[core]
+
+    if out_path is not None:
+        matrix.flush()
+    if raw_path is not None:
+        del raw
+        os.remove(raw_path)
+
+    print_matrix(matrix)
     return matrix
 
 
@@ -117,64 +476,97 @@ def place_existing_info(json_data, matrix, left_buffer, top_buffer):
 #     return result
 
 
-def estimate_unknown_regions(arr, diffusion_rate=0.5, power=2, offset=0.3):
-    """
-    Inverse power law decay: weight = 1 / (distance + offset)^power
-    Steep drop initially, long gentle tail
-    """
-    max_neighbors = maximum_filter(arr, size=3, mode='constant', cval=0)
+KERNEL_DISTANCES = np.array([
+    [np.sqrt(2), 1, np.sqrt(2)],
+    [1, 0, 1],
+    [np.sqrt(2), 1, np.sqrt(2)]
+])
+
 
-    # Distance-based weights with inverse power law
-    distances = np.array([
-        [np.sqrt(2), 1, np.sqrt(2)],
-        [1, 0, 1],
-        [np.sqrt(2), 1, np.sqrt(2)]
-    ])
+@lru_cache(maxsize=None)
+def sigmoid_kernel(mid=1.5, k=5):
+    return 1.0 / (1.0 + np.exp(k * (KERNEL_DISTANCES - mid)))
 
+
+@lru_cache(maxsize=None)
+def power_kernel(power=2, offset=0.3):
     # Inverse power law decay
-    weights = 1.0 / ((distances + offset) ** power)
+    weights = 1.0 / ((KERNEL_DISTANCES + offset) ** power)
     weights[1, 1] = 1.0  # Center gets full weight
+    return weights
 
-    mid, k = 1.5, 5
-    weights = 1.0 / (1.0 + np.exp(k * (distances - mid)))
-    weighted_avg = convolve(arr.astype(np.float64), weights, mode='constant', cval=0)
 
-    result = arr.copy().astype(np.float64)
-    mask = arr < max_neighbors
-    result[mask] = (1 - diffusion_rate) * arr[mask] + diffusion_rate * weighted_avg[mask]
+def diffusion_buffers(shape, dtype=np.float64):
+    """
+    Scratch arrays shared by every pass of the diffusion kernels, so a run
+    allocates them once instead of several full-grid temporaries per pass.
+    """
+    return {
+        'max_neighbors': np.empty(shape, dtype=dtype),
+        'weighted': np.empty(shape, dtype=dtype),
+        'normalizer': np.empty(shape, dtype=dtype),
+        'blend': np.empty(shape, dtype=dtype),
+        'mask': np.empty(shape, dtype=bool),
+    }
 
-    return result
 
+def blend_masked(arr, weighted_avg, diffusion_rate, buffers):
+    """arr[mask] = (1 - rate) * arr + rate * weighted_avg, in place (mask = arr < local max)."""
+    maximum_filter(arr, size=3, mode='constant', cval=0, output=buffers['max_neighbors'])
+    np.less(arr, buffers['max_neighbors'], out=buffers['mask'])
+
+    blend = buffers['blend']
+    np.multiply(arr, 1 - diffusion_rate, out=blend)
+    np.multiply(weighted_avg, diffusion_rate, out=weighted_avg)
+    blend += weighted_avg
+    np.copyto(arr, blend, where=buffers['mask'])
+    return arr
 
-def estimate_unknown_regions2(arr, diffusion_rate=0.5, power=2, offset=0.3):
+
+def estimate_unknown_regions(arr, diffusion_rate=0.5, power=2, offset=0.3, buffers=None):
     """
-    Inverse power law decay: weight = 1 / (distance + offset)^power
-    Steep drop initially, long gentle tail
+    Sigmoid distance decay: weight = 1 / (1 + exp(k * (distance - mid)))
+    Only cells below their local maximum move.
+
+    Without buffers a new float64 array is returned; with buffers (see
+    diffusion_buffers) arr is updated in place and returned.
     """
-    max_neighbors = maximum_filter(arr, size=3, mode='constant', cval=0)
+    if buffers is None:
+        arr = arr.astype(np.float64)
+        buffers = diffusion_buffers(arr.shape, arr.dtype)
 
-    # Distance-based weights with inverse power law
-    distances = np.array([
-        [np.sqrt(2), 1, np.sqrt(2)],
-        [1, 0, 1],
-        [np.sqrt(2), 1, np.sqrt(2)]
-    ])
+    weighted_avg = buffers['weighted']
+    convolve(arr, sigmoid_kernel(), mode='constant', cval=0, output=weighted_avg)
 
-    # Inverse power law decay
-    weights = 1.0 / ((distances + offset) ** power)
-    weights[1, 1] = 1.0  # Center gets full weight
+    return blend_masked(arr, weighted_avg, diffusion_rate, buffers)
 
-    weighted_sum = convolve(arr, weights, mode='constant', cval=0)
-    normalizer = convolve((arr > 0).astype(float), weights, mode='constant', cval=0)
-    weighted_avg = np.divide(weighted_sum, normalizer,
-                             out=np.zeros_like(weighted_sum),
-                             where=normalizer > 0)
 
-    result = arr.copy().astype(np.float64)
-    mask = arr < max_neighbors
-    result[mask] = (1 - diffusion_rate) * arr[mask] + diffusion_rate * weighted_avg[mask]
+def estimate_unknown_regions2(arr, diffusion_rate=0.5, power=2, offset=0.3, buffers=None):
+    """
+    Inverse power law decay: weight = 1 / (distance + offset)^power
+    Steep drop initially, long gentle tail. Averages over non-zero neighbours only.
 
-    return result
+    Without buffers a new float64 array is returned; with buffers (see
+    diffusion_buffers) arr is updated in place and returned.
+    """
+    if buffers is None:
+        arr = arr.astype(np.float64)
+        buffers = diffusion_buffers(arr.shape, arr.dtype)
+
+    weights = power_kernel(power, offset)
+    weighted_avg, normalizer, mask = buffers['weighted'], buffers['normalizer'], buffers['mask']
+
+    np.greater(arr, 0, out=mask)
+    buffers['blend'][...] = mask
+    convolve(buffers['blend'], weights, mode='constant', cval=0, output=normalizer)
+    convolve(arr, weights, mode='constant', cval=0, output=weighted_avg)
+
+    np.greater(normalizer, 0, out=mask)
+    np.divide(weighted_avg, normalizer, out=weighted_avg, where=mask)
+    np.logical_not(mask, out=mask)
+    np.copyto(weighted_avg, 0, where=mask)
+
+    return blend_masked(arr, weighted_avg, diffusion_rate, buffers)
 
 
 def rescale_to_range(arr, target_min=1.0, target_max=5.0):
@@ -320,19 +712,17 @@ def place_station_labels(json_data, matrix, left_buffer, top_buffer, ax=None):
     with lines pointing exactly to their markers, labels offset, and manual point shifts.
     """
     if ax is None:
+        import matplotlib.pyplot as plt
         ax = plt.gca()
 
-    max_lat = get_min_max_coordinate(json_data, 'latitude')[1]
-    min_lon = get_min_max_coordinate(json_data, 'longitude')[0]
+    registry = StationRegistry.of(json_data)
+    station_j, station_i = registry.grid_indices(left_buffer, top_buffer)
 
     rows, cols = matrix.shape
 
     # Collect all station positions
     stations = []
-    for name in json_data:
-        i = coord_to_index(json_data[name]['latitude'], max_lat, top_buffer)
-        j = coord_to_index(json_data[name]['longitude'], min_lon, left_buffer)
-
+    for name, i, j in zip(registry.names, station_i.tolist(), station_j.tolist()):
         # Flip vertically
         i_flipped = rows - 1 - i
         # Rotate 90° anticlockwise
@@ -406,11 +796,103 @@ def place_station_labels(json_data, matrix, left_buffer, top_buffer, ax=None):
                     markeredgecolor='black', markeredgewidth=2)
 
 
+def heatmap_figsize(shape, width=8):
+    """Figure height proportional to rows, width proportional to cols (of the rotated grid)."""
+    rows, cols = shape
+    return width, width * rows / cols
+
+
+def draw_heatmap(fig, matrix, json_data, left_buffer, top_buffer, title="Heatmap with Station Labels"):
+    """
+    Draw the heatmap, colorbar and station labels onto fig (any Figure,
+    pyplot-managed or not), vertically flipped and rotated 90° anticlockwise.
+    Returns the axes.
+    """
+    # Ensure matrix is numeric
+    numeric_matrix = np.array(matrix, dtype=np.float64)
+
+    # --- Flip vertically, then rotate 90° anticlockwise ---
+    numeric_matrix = np.rot90(np.flipud(numeric_matrix), k=1)
+
+    ax = fig.add_subplot()
+    im = ax.imshow(
+        numeric_matrix,
+        interpolation='nearest',
+        origin='lower',
+        aspect='auto'
+    )
+    fig.colorbar(im, ax=ax, label='Value')
+
+    # Add station labels
+    place_station_labels(json_data, numeric_matrix, left_buffer, top_buffer, ax=ax)
+
+    ax.set_title(title)
+    ax.set_xlabel("Column index")
+    ax.set_ylabel("Row index")
+    return ax
+
+
+def render_heatmap(matrix, json_data, left_buffer, top_buffer, title="Heatmap with Station Labels",
+                   save_path=None, format="png", dpi=300):
+    """
+    Headless plot_heatmap: draws on a standalone Agg figure that pyplot never
+    sees, so nothing blocks and no figure outlives the call. Writes to
+    save_path if given (and returns it), otherwise returns the image bytes.
+    """
+    from io import BytesIO
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    fig = Figure(figsize=heatmap_figsize(np.shape(matrix)[::-1]))
+    FigureCanvasAgg(fig)
+    draw_heatmap(fig, matrix, json_data, left_buffer, top_buffer, title)
+
+    if save_path is not None:
+        fig.savefig(save_path, format=format, bbox_inches='tight', dpi=dpi)
+        return save_path
+
+    buf = BytesIO()
+    fig.savefig(buf, format=format, bbox_inches='tight', dpi=dpi)
+    return buf.getvalue()
+
+
+def render_heatmap_job(job):
+    return render_heatmap(**job)
+
+
+def render_heatmaps(jobs, workers=1, max_pending=None):
+    """
+    Render many heatmaps (one per day, per scenario, ...) with render_heatmap.
+    Each job is a dict of render_heatmap keyword arguments; results come back
+    in job order. With workers > 1 they are rendered over a process pool.
+    jobs may be a generator: at most max_pending jobs (default 2 * workers)
+    are drawn from it and in flight at once, so its matrices are built as
+    the pool keeps up rather than all up front.
+    """
+    from collections import deque
+    from concurrent.futures import ProcessPoolExecutor
+
+    if workers <= 1:
+        return [render_heatmap_job(job) for job in jobs]
+
+    max_pending = max_pending or 2 * workers
+    results, pending = [], deque()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for job in jobs:
+            if len(pending) >= max_pending:
+                results.append(pending.popleft().result())
+            pending.append(pool.submit(render_heatmap_job, job))
+        results.extend(future.result() for future in pending)
+    return results
+
+
 def plot_heatmap(matrix, json_data, left_buffer, top_buffer, title="Heatmap with Station Labels", save_path="heatmap.png"):
     """
     Plot heatmap with station labels overlaid,
     vertically flipped and rotated 90° anticlockwise.
     Optionally save the figure as an image file.
+    Interactive: shows the figure through pyplot. Use render_heatmap for
+    servers and batch jobs.
 
     Args:
         matrix: 2D numpy array of values
@@ -421,42 +903,13 @@ def plot_heatmap(matrix, json_data, left_buffer, top_buffer, title="Heatmap with
         save_path: If provided, saves the figure to this path (e.g., 'heatmap.png')
     """
     import matplotlib.pyplot as plt
-    import numpy as np
-
-    # Ensure matrix is numeric
-    numeric_matrix = np.array(matrix, dtype=np.float64)
-
-    # --- Flip vertically ---
-    numeric_matrix = np.flipud(numeric_matrix)
-
-    # --- Rotate 90° anticlockwise ---
-    numeric_matrix = np.rot90(numeric_matrix, k=1)
-
-    rows, cols = numeric_matrix.shape
-
-    # Make figure height proportional to number of rows, width proportional to number of cols
-    aspect_ratio = rows / cols
-    plt.figure(figsize=(8, 8 * aspect_ratio))
-
-    # Create the heatmap
-    im = plt.imshow(
-        numeric_matrix,
-        interpolation='nearest',
-        origin='lower',
-        aspect='auto'
-    )
-    plt.colorbar(im, label='Value')
-
-    # Add station labels
-    place_station_labels(json_data, numeric_matrix, left_buffer, top_buffer)
 
-    plt.title(title)
-    plt.xlabel("Column index")
-    plt.ylabel("Row index")
+    fig = plt.figure(figsize=heatmap_figsize(np.shape(matrix)[::-1]))
+    draw_heatmap(fig, matrix, json_data, left_buffer, top_buffer, title)
 
     # Save image if path is provided
     if save_path is not None:
-        plt.savefig(save_path, bbox_inches='tight', dpi=300)
+        fig.savefig(save_path, bbox_inches='tight', dpi=300)
 
     plt.show()
 
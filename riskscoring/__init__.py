@@ -0,0 +1,6 @@
+"""Station drought risk scoring.
+
+Import the stages from riskscoring.pipeline (RiskPipeline, load_rainfall, ...);
+run the whole thing with `python -m riskscoring` or `python riskscoring/riskscoring.py`.
+Importing the package itself loads nothing heavy.
+"""
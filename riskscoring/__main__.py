@@ -0,0 +1,3 @@
+from .riskscoring import main
+
+main()
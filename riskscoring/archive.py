@@ -0,0 +1,166 @@
+"""Fixed-stride daily rainfall archive for all stations.
+
+    python -m riskscoring.archive OUT.rain [DATA_DIR] [--workers N]
+
+Layout of a .rain file:
+
+    8 bytes   magic b"RAINARC1"
+    4 bytes   header length, little-endian uint32
+    header    JSON: version, epoch (first day), n_days, dtype, data_offset,
+              stations [{station_num, station_name}]
+    padding   to a 64-byte boundary
+    data      float32[n_stations, n_days], row-major, NaN for missing days
+
+Row i holds station i, column d holds epoch + d days, so any (station, date)
+is one offset computation, and every reader shares the same pages through
+np.memmap instead of re-parsing the nested years -> MonthName -> day JSON.
+"""
+import argparse
+import json
+import os
+import struct
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+from .ingest import COLUMNS, load_all_stations, print_load_report
+
+MAGIC = b"RAINARC1"
+ARCHIVE_VERSION = 1
+ALIGN = 64
+DEFAULT_DATA_DIR = Path(__file__).resolve().parent.parent / "public" / "data"
+
+def write_archive(path: Path, frames) -> Path:
+    """Write flattened station frames (ingest COLUMNS layout) as one archive; later rows win a day."""
+    frames = [f for f in frames if len(f)]
+    if not frames:
+        raise ValueError("no station rows to archive")
+    epoch = min(f["date"].min() for f in frames).normalize()
+    end = max(f["date"].max() for f in frames).normalize()
+    n_days = (end - epoch).days + 1
+
+    stations = [{"station_num": str(f["station_num"].iloc[0]), "station_name": str(f["station_name"].iloc[0])}
+                for f in frames]
+    header = {"version": ARCHIVE_VERSION, "epoch": epoch.strftime("%Y-%m-%d"), "n_days": n_days,
+              "dtype": "float32", "stations": stations}
+    # data_offset depends on the header length, which depends on data_offset; settle it in two passes
+    header["data_offset"] = 0
+    for _ in range(2):
+        raw = json.dumps(header).encode("utf-8")
+        header["data_offset"] = -(-(len(MAGIC) + 4 + len(raw)) // ALIGN) * ALIGN
+    raw = json.dumps(header).encode("utf-8")
+
+    path = Path(path)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(MAGIC + struct.pack("<I", len(raw)) + raw)
+        f.write(b"\0" * (header["data_offset"] - f.tell()))
+    data = np.memmap(tmp, dtype=np.float32, mode="r+", offset=header["data_offset"], shape=(len(frames), n_days))
+    data[:] = np.nan
+    for i, f in enumerate(frames):
+        days = (f["date"].dt.normalize() - epoch).dt.days.to_numpy()
+        data[i, days] = f["rainfall_mm"].to_numpy(dtype=np.float32)
+    data.flush()
+    del data
+    os.replace(tmp, path)
+    return path
+
+def read_header(path: Path) -> dict:
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a rainfall archive")
+        (length,) = struct.unpack("<I", f.read(4))
+        header = json.loads(f.read(length))
+    if header["version"] != ARCHIVE_VERSION:
+        raise ValueError(f"{path}: unsupported archive version {header['version']}")
+    return header
+
+class RainArchive:
+    """Read-only view of a .rain file; `data` is the memory-mapped stations x days array."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.header = read_header(self.path)
+        self.epoch = np.datetime64(self.header["epoch"], "D")
+        self.n_days = self.header["n_days"]
+        self.stations = self.header["stations"]
+        self.data = np.memmap(self.path, dtype=np.float32, mode="r", offset=self.header["data_offset"],
+                              shape=(len(self.stations), self.n_days))
+        self._index = {}
+        for i, s in enumerate(self.stations):
+            self._index.setdefault(s["station_name"], i)
+            self._index.setdefault(s["station_num"], i)
+
+    def __len__(self):
+        return len(self.stations)
+
+    @property
+    def dates(self) -> np.ndarray:
+        return self.epoch + np.arange(self.n_days)
+
+    def station_index(self, station) -> int:
+        """Row of a station, by name, number or row index."""
+        return station if isinstance(station, (int, np.integer)) else self._index[str(station)]
+
+    def day_index(self, date):
+        """Column(s) for a date or array of dates; -1 where outside the archive."""
+        d = (np.asarray(date, dtype="datetime64[D]") - self.epoch).astype(np.int64)
+        return np.where((d >= 0) & (d < self.n_days), d, -1)
+
+    def value(self, station, date) -> float:
+        """Rainfall for one station-day, NaN if missing or outside the archive."""
+        d = int(self.day_index(date))
+        return float(self.data[self.station_index(station), d]) if d >= 0 else float("nan")
+
+    def series(self, station, start=None, end=None) -> np.ndarray:
+        """The station's daily values from start to end inclusive, as a view of the mapped bytes."""
+        lo = 0 if start is None else max(int((np.datetime64(start, "D") - self.epoch).astype(np.int64)), 0)
+        hi = self.n_days if end is None else min(int((np.datetime64(end, "D") - self.epoch).astype(np.int64)) + 1,
+                                                 self.n_days)
+        return self.data[self.station_index(station), lo:hi]
+
+    def to_frame(self, stations=None, decimals=4) -> pd.DataFrame:
+        """
+        Long frame in the ingest COLUMNS layout (missing days dropped), as
+        flatten_station_json returns. Values are rounded to `decimals` so the
+        float32 storage reads back as the original decimal readings.
+        """
+        rows = range(len(self)) if stations is None else [self.station_index(s) for s in stations]
+        dates = self.dates
+        parts = []
+        for i in rows:
+            values = np.asarray(self.data[i], dtype=np.float64)
+            present = ~np.isnan(values)
+            n = int(present.sum())
+            parts.append(pd.DataFrame({
+                "station_num": np.full(n, self.stations[i]["station_num"], dtype=object),
+                "station_name": np.full(n, self.stations[i]["station_name"], dtype=object),
+                "date": dates[present].astype("datetime64[ns]"),
+                "rainfall_mm": np.round(values[present], decimals),
+            }))
+        if not parts:
+            return pd.DataFrame(columns=COLUMNS)
+        return pd.concat(parts, ignore_index=True).astype({"station_num": "str", "station_name": "str"})
+
+def build_archive(out: Path, paths, workers=None) -> Path:
+    frames, report = load_all_stations(paths, workers=workers)
+    print_load_report(report, per_file=False)
+    return write_archive(out, frames)
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("out", type=Path)
+    ap.add_argument("data_dir", nargs="?", type=Path, default=DEFAULT_DATA_DIR)
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = ap.parse_args()
+
+    paths = sorted(args.data_dir.glob("*.json"))
+    if not paths:
+        raise FileNotFoundError(f"No JSON files found in {args.data_dir}")
+    build_archive(args.out, paths, args.workers)
+    archive = RainArchive(args.out)
+    print(f"{len(archive)} stations x {archive.n_days} days from {archive.epoch} → {args.out} "
+          f"({args.out.stat().st_size / 1e6:.1f} MB)")
+
+if __name__ == "__main__":
+    main()
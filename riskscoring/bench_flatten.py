@@ -0,0 +1,49 @@
+"""Benchmark: columnar flatten_station_json vs the original per-day pd.to_datetime loop.
+
+    python -m riskscoring.bench_flatten [DATA_DIR] [--repeat N]
+"""
+import argparse
+import time
+from pathlib import Path
+import pandas as pd
+
+from .ingest import flatten_station_json, flatten_station_json_reference
+
+DEFAULT_DATA_DIR = Path(__file__).resolve().parent.parent / "public" / "data"
+
+def best_of(fn, path, repeat):
+    best = float("inf")
+    out = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn(path)
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("data_dir", nargs="?", type=Path, default=DEFAULT_DATA_DIR)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    files = sorted(args.data_dir.glob("rain_json_*.json"))
+    if not files:
+        raise FileNotFoundError(f"No rain_json_*.json files found in {args.data_dir}")
+
+    total_ref = total_new = 0.0
+    rows = 0
+    for fp in files:
+        t_ref, df_ref = best_of(flatten_station_json_reference, fp, args.repeat)
+        t_new, df_new = best_of(flatten_station_json, fp, args.repeat)
+        pd.testing.assert_frame_equal(df_ref, df_new)
+        total_ref += t_ref
+        total_new += t_new
+        rows += len(df_new)
+        print(f"{fp.name:45s} rows={len(df_new):6d}  loop={t_ref*1000:8.1f}ms  "
+              f"columnar={t_new*1000:7.1f}ms  x{t_ref / max(t_new, 1e-9):5.1f}")
+
+    print(f"\n{len(files)} files, {rows} rows: loop={total_ref:.2f}s columnar={total_new:.2f}s "
+          f"speedup x{total_ref / max(total_new, 1e-9):.1f} (outputs identical)")
+
+if __name__ == "__main__":
+    main()
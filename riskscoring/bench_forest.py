@@ -0,0 +1,94 @@
+"""Benchmark: CompiledForest.predict_proba vs RandomForestClassifier.predict_proba.
+
+Fits the production forest shape (300 trees, depth 10) on synthetic rows shaped
+like the drought features, then checks the compiled probabilities match to
+1e-12 and that they give the same percentile-rank risk classes as bin_risk.
+
+Timed twice: one bulk call, as a full run scores, and --station-rows batches,
+as an incremental run scores each station's new days. The compiled forest is
+what incremental state serves, so the bench fails unless it is faster there;
+bulk scoring stays on scikit-learn (single core, 100k rows: 0.53s vs 2.7s
+compiled, while 30-row batches score ~11x faster compiled).
+
+    python -m riskscoring.bench_forest [--rows N] [--train-rows N] [--station-rows N] [--repeat N]
+"""
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+
+from .forest import compile_forest
+
+def synthetic_features(n, rng):
+    rain = rng.gamma(0.4, 8.0, size=(n, 30))
+    X = np.column_stack([
+        rain[:, :7].sum(axis=1),               # rain_7d
+        rain.sum(axis=1),                      # rain_30d
+        rng.standard_normal(n),                # rain_anomaly
+        rng.choice([7073.0, 15000.0, 42000.0], size=n),  # population_2025
+    ])
+    y = (X[:, 1] < np.quantile(X[:, 1], 0.2)).astype(int)
+    return X, y
+
+def risk_classes(p, n_classes=5):
+    """pipeline.bin_risk's classes for a vector of risk probabilities."""
+    q = pd.Series(p).rank(pct=True, method="average")
+    return np.ceil(q * n_classes).astype(int).clip(1, n_classes).to_numpy()
+
+def best_of(fn, repeat):
+    best, out = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rows", type=int, default=200_000)
+    ap.add_argument("--train-rows", type=int, default=50_000)
+    ap.add_argument("--station-rows", type=int, default=30,
+                    help="rows per call in the incremental timing (one station's new days)")
+    ap.add_argument("--station-batches", type=int, default=50)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(42)
+    X_train, y_train = synthetic_features(args.train_rows, rng)
+    X, _ = synthetic_features(args.rows, rng)
+
+    # n_jobs=1 so scikit-learn sums trees in a fixed order, as the compiled evaluator does
+    rf = RandomForestClassifier(n_estimators=300, max_depth=10, random_state=42,
+                                class_weight="balanced_subsample", n_jobs=1)
+    rf.fit(X_train, y_train)
+
+    t0 = time.perf_counter()
+    forest = compile_forest(rf)
+    t_compile = time.perf_counter() - t0
+
+    t_ref, p_ref = best_of(lambda: rf.predict_proba(X), args.repeat)
+    t_new, p_new = best_of(lambda: forest.predict_proba(X), args.repeat)
+    np.testing.assert_allclose(p_new, p_ref, rtol=0, atol=1e-12)
+    classes_ref, classes_new = risk_classes(p_ref[:, 1]), risk_classes(p_new[:, 1])
+    np.testing.assert_array_equal(classes_ref, classes_new)
+    if np.array_equal(p_ref, p_new):
+        agreement = "probabilities identical"
+    else:
+        agreement = (f"{int((p_ref != p_new).sum())} probabilities differ, max |d|={np.abs(p_ref - p_new).max():.1e}, "
+                     f"risk classes identical")
+
+    batches = [X[i * args.station_rows:(i + 1) * args.station_rows] for i in range(args.station_batches)]
+    s_ref, _ = best_of(lambda: [rf.predict_proba(b) for b in batches], args.repeat)
+    s_new, _ = best_of(lambda: [forest.predict_proba(b) for b in batches], args.repeat)
+
+    print(f"{len(forest.feature)} nodes in {forest.n_estimators} trees, compiled in {t_compile*1000:.0f}ms")
+    print(f"bulk, {args.rows} rows: sklearn={t_ref:.2f}s ({args.rows / t_ref:,.0f} rows/s)  "
+          f"compiled={t_new:.2f}s ({args.rows / t_new:,.0f} rows/s)  x{t_ref / max(t_new, 1e-9):.1f} "
+          f"({agreement})")
+    print(f"incremental, {args.station_batches} x {args.station_rows} rows: sklearn={s_ref*1000:.0f}ms  "
+          f"compiled={s_new*1000:.0f}ms  x{s_ref / max(s_new, 1e-9):.1f}")
+    assert s_new < s_ref, "compiled forest is not faster than scikit-learn on incremental batches"
+
+if __name__ == "__main__":
+    main()
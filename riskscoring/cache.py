@@ -0,0 +1,67 @@
+import hashlib
+import os
+import time
+from pathlib import Path
+import pandas as pd
+
+from .ingest import load_station_file
+
+# Flattened station frames cached as columnar files. The cache file name encodes
+# the source path, mtime and size, so editing a source JSON simply misses and
+# rebuilds; stale entries for the same source are removed on write.
+CACHE_FORMATS = {
+    "parquet": (".parquet", pd.DataFrame.to_parquet, pd.read_parquet),
+    "feather": (".feather", pd.DataFrame.to_feather, pd.read_feather),
+}
+
+def source_key(path: Path) -> tuple:
+    path = Path(path).resolve()
+    st = path.stat()
+    return str(path), st.st_mtime_ns, st.st_size
+
+def cache_path(cache_dir: Path, path: Path, fmt: str = "parquet") -> Path:
+    src, mtime_ns, size = source_key(path)
+    ext = CACHE_FORMATS[fmt][0]
+    src_hash = hashlib.sha1(src.encode("utf-8")).hexdigest()[:16]
+    return Path(cache_dir) / f"{Path(src).stem}-{src_hash}-{mtime_ns}-{size}{ext}"
+
+def _stale_entries(target: Path):
+    # same source, different mtime/size
+    prefix = target.name.rsplit("-", 2)[0] + "-"
+    return [p for p in target.parent.glob(prefix + "*")
+            if p != target and not p.name.endswith(".tmp")]
+
+def read_cached(cache_dir: Path, path: Path, fmt: str = "parquet"):
+    """Cached frame for `path`, or None if missing or out of date."""
+    target = cache_path(cache_dir, path, fmt)
+    if not target.exists():
+        return None
+    return CACHE_FORMATS[fmt][2](target)
+
+def write_cached(cache_dir: Path, path: Path, df: pd.DataFrame, fmt: str = "parquet") -> Path:
+    target = cache_path(cache_dir, path, fmt)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_name(f"{target.name}.{os.getpid()}.tmp")
+    CACHE_FORMATS[fmt][1](df.reset_index(drop=True), tmp)
+    os.replace(tmp, target)  # atomic, safe with several workers
+    for stale in _stale_entries(target):
+        stale.unlink(missing_ok=True)
+    return target
+
+def load_station_cached(path: Path, cache_dir: Path, fmt: str = "parquet") -> dict:
+    """Drop-in replacement for ingest.load_station_file backed by the columnar cache."""
+    t0 = time.perf_counter()
+    try:
+        df = read_cached(cache_dir, path, fmt)
+    except Exception:  # unreadable/corrupt entry -> rebuild
+        df = None
+    if df is not None:
+        return {"file": Path(path).name, "frame": df, "rows": len(df),
+                "seconds": time.perf_counter() - t0, "error": None, "cached": True}
+
+    result = load_station_file(path)
+    if result["error"] is None:
+        write_cached(cache_dir, path, result["frame"], fmt)
+    result["seconds"] = time.perf_counter() - t0
+    result["cached"] = False
+    return result
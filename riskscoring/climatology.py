@@ -0,0 +1,190 @@
+import os
+import warnings
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+from .panel import StationPanel
+
+# Per-station rainfall climatology, kept as (count, mean, M2) tables by calendar
+# month [stations, 12] and by day of year [stations, 365], plus optional
+# percentiles, taken from a panel only when asked for (they need every raw
+# value, and scoring reads only the moments). The moments merge exactly with new data
+# (Chan/Welford), so a daily refresh folds in its new rows and looks their
+# anomalies up against the whole history without re-reading it; the tables
+# round-trip through one .npz.
+#
+# Day of year is on a 365-day calendar (29 February counts as the 28th). The
+# day-of-year statistics used for lookups are smoothed: each day pools the
+# moments of the days within +/- smooth_days of it, wrapping round the year.
+PERCENTILES = (10, 50, 90)
+SMOOTH_DAYS = 15
+MONTH_DAYS = np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+MONTH_START = np.concatenate(([0], np.cumsum(MONTH_DAYS)[:-1]))
+
+def month_and_doy(dates):
+    """(month 0..11, day of year 0..364) for an array of dates."""
+    d = np.asarray(dates, dtype="datetime64[D]")
+    m = d.astype("datetime64[M]")
+    month = m.astype(np.int64) % 12
+    day = (d - m.astype("datetime64[D]")).astype(np.int64)
+    return month, MONTH_START[month] + np.minimum(day, MONTH_DAYS[month] - 1)
+
+def merge_moments(n_a, mean_a, m2_a, n_b, mean_b, m2_b):
+    """Combine two sets of (count, mean, M2) elementwise, as if their samples were pooled."""
+    n = n_a + n_b
+    delta = mean_b - mean_a
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(n > 0, mean_a + delta * n_b / n, 0.0)
+        m2 = np.where(n > 0, m2_a + m2_b + delta * delta * n_a * n_b / n, 0.0)
+    return n, mean, m2
+
+def bucket_moments(rows, buckets, values, shape):
+    """(count, mean, M2) of values grouped by (row, bucket) into arrays of `shape`."""
+    n = np.zeros(shape)
+    total = np.zeros(shape)
+    np.add.at(n, (rows, buckets), 1.0)
+    np.add.at(total, (rows, buckets), values)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(n > 0, total / n, 0.0)
+    m2 = np.zeros(shape)
+    dev = values - mean[rows, buckets]
+    np.add.at(m2, (rows, buckets), dev * dev)
+    return n, mean, m2
+
+def zscore(x, n, mean, m2):
+    """(x - mean) / sample std; NaN below two observations, std 0 treated as 1."""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        std = np.sqrt(m2 / (n - 1))
+    std = np.where(n < 2, np.nan, np.where(std == 0, 1.0, std))
+    return (x - mean) / std
+
+class Climatology:
+    def __init__(self, stations, month, doy, month_pct=None, doy_pct=None, smooth_days=SMOOTH_DAYS):
+        self.stations = [str(s) for s in stations]
+        self.month = [np.asarray(a, dtype=np.float64) for a in month]   # n, mean, M2: [stations, 12]
+        self.doy = [np.asarray(a, dtype=np.float64) for a in doy]       # n, mean, M2: [stations, 365]
+        S = len(self.stations)
+        self.month_pct = np.full((S, 12, len(PERCENTILES)), np.nan) if month_pct is None else month_pct
+        self.doy_pct = np.full((S, 365, len(PERCENTILES)), np.nan) if doy_pct is None else doy_pct
+        self.smooth_days = int(smooth_days)
+        self._index = {s: i for i, s in enumerate(self.stations)}
+
+    @classmethod
+    def empty(cls, stations=(), smooth_days=SMOOTH_DAYS):
+        S = len(stations)
+        zeros = lambda k: [np.zeros((S, k)) for _ in range(3)]
+        return cls(stations, zeros(12), zeros(365), smooth_days=smooth_days)
+
+    @classmethod
+    def from_panel(cls, panel: StationPanel, smooth_days=SMOOTH_DAYS, percentiles=False):
+        """Tables over every observed day of the panel; with `percentiles`, the percentiles too."""
+        clim = cls.empty(panel.stations, smooth_days)
+        s, d = np.nonzero(panel.mask & ~np.isnan(panel.values))
+        x = panel.values[s, d]
+        month, doy = month_and_doy(panel.dates)
+        clim.month = list(bucket_moments(s, month[d], x, (len(clim.stations), 12)))
+        clim.doy = list(bucket_moments(s, doy[d], x, (len(clim.stations), 365)))
+        if percentiles:
+            clim.compute_percentiles(panel)
+        return clim
+
+    @classmethod
+    def from_frame(cls, df, smooth_days=SMOOTH_DAYS, percentiles=False):
+        return cls.from_panel(StationPanel.from_frame(df, "rainfall_mm"), smooth_days, percentiles)
+
+    def compute_percentiles(self, panel: StationPanel):
+        """Fill the month and smoothed day-of-year percentiles of this table's stations from panel."""
+        rows = self._rows(panel.stations)
+        values = np.where(panel.mask, panel.values, np.nan)
+        month, doy = month_and_doy(panel.dates)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)   # station-months with no data
+            for m in range(12):
+                cols = month == m
+                if cols.any():
+                    self.month_pct[rows, m] = np.nanpercentile(values[:, cols], PERCENTILES, axis=1).T
+            # the smoothing window's days, pooled across years
+            for k in range(365):
+                cols = np.abs((doy - k + 182) % 365 - 182) <= self.smooth_days
+                if cols.any():
+                    self.doy_pct[rows, k] = np.nanpercentile(values[:, cols], PERCENTILES, axis=1).T
+
+    def _rows(self, stations) -> np.ndarray:
+        """Table rows for each station, adding empty rows for stations not seen yet."""
+        stations = np.asarray(stations).astype(str)
+        new = [s for s in dict.fromkeys(stations) if s not in self._index]
+        if new:
+            for s in new:
+                self._index[s] = len(self.stations)
+                self.stations.append(s)
+            pad = lambda a: np.concatenate([a, np.zeros((len(new),) + a.shape[1:])])
+            self.month = [pad(a) for a in self.month]
+            self.doy = [pad(a) for a in self.doy]
+            self.month_pct = np.concatenate([self.month_pct, np.full((len(new),) + self.month_pct.shape[1:], np.nan)])
+            self.doy_pct = np.concatenate([self.doy_pct, np.full((len(new),) + self.doy_pct.shape[1:], np.nan)])
+        return np.array([self._index[s] for s in stations], dtype=np.intp)
+
+    def update(self, stations, dates, values):
+        """Fold a batch of new station-days into the moments. Percentiles keep their computed values."""
+        values = np.asarray(values, dtype=np.float64)
+        keep = ~np.isnan(values)
+        rows = self._rows(stations)[keep]
+        month, doy = month_and_doy(np.asarray(dates)[keep])
+        values = values[keep]
+        self.month = list(merge_moments(*self.month, *bucket_moments(rows, month, values, self.month[0].shape)))
+        self.doy = list(merge_moments(*self.doy, *bucket_moments(rows, doy, values, self.doy[0].shape)))
+
+    def lookup_rows(self, stations) -> np.ndarray:
+        """Table row of each station, -1 for stations without a climatology."""
+        return pd.Index(self.stations).get_indexer(np.asarray(stations).astype(str))
+
+    def monthly_means(self, stations) -> np.ndarray:
+        """[stations, 12] mean rainfall per calendar month, 0 for stations without a climatology."""
+        rows = self.lookup_rows(stations)
+        return np.where((rows >= 0)[:, None], self.month[1][rows], 0.0)
+
+    def smoothed_doy(self):
+        """(count, mean, M2) per station and day of year, pooled over +/- smooth_days."""
+        n, mean, m2 = self.doy
+        total, sq = n * mean, m2 + n * mean * mean   # pool as sums, then back to moments
+        pn, ptotal, psq = (np.zeros_like(n) for _ in range(3))
+        for k in range(-self.smooth_days, self.smooth_days + 1):
+            pn += np.roll(n, k, axis=1)
+            ptotal += np.roll(total, k, axis=1)
+            psq += np.roll(sq, k, axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            pmean = np.where(pn > 0, ptotal / pn, 0.0)
+        return pn, pmean, np.maximum(psq - pn * pmean * pmean, 0.0)
+
+    def anomaly(self, stations, dates, values, by="month") -> np.ndarray:
+        """z-score of each value against its station's month (or smoothed day-of-year) climatology."""
+        rows = self.lookup_rows(stations)
+        month, doy = month_and_doy(dates)
+        n, mean, m2 = self.month if by == "month" else self.smoothed_doy()
+        col = month if by == "month" else doy
+        z = zscore(np.asarray(values, dtype=np.float64), n[rows, col], mean[rows, col], m2[rows, col])
+        return np.where(rows >= 0, z, np.nan)
+
+    def percentiles(self, stations, dates, by="month") -> np.ndarray:
+        """[rows, len(PERCENTILES)] percentiles for each station-date; NaN until compute_percentiles has run."""
+        rows = self.lookup_rows(stations)
+        month, doy = month_and_doy(dates)
+        out = self.month_pct[rows, month] if by == "month" else self.doy_pct[rows, doy]
+        out[rows < 0] = np.nan
+        return out
+
+    def save(self, path: Path):
+        path = Path(path)
+        tmp = path.with_name(f"{path.stem}.{os.getpid()}.tmp.npz")
+        np.savez(tmp, stations=np.array(self.stations, dtype=str),
+                 month_n=self.month[0], month_mean=self.month[1], month_m2=self.month[2],
+                 doy_n=self.doy[0], doy_mean=self.doy[1], doy_m2=self.doy[2],
+                 month_pct=self.month_pct, doy_pct=self.doy_pct, smooth_days=self.smooth_days)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path):
+        with np.load(path, allow_pickle=False) as z:
+            return cls(z["stations"], (z["month_n"], z["month_mean"], z["month_m2"]),
+                       (z["doy_n"], z["doy_mean"], z["doy_m2"]), z["month_pct"], z["doy_pct"], z["smooth_days"])
@@ -0,0 +1,61 @@
+import hashlib
+import json
+import os
+import pickle
+import time
+from pathlib import Path
+
+# Memoised pipeline stages. A stage's key hashes its name, code version,
+# parameters and the keys of the stages it reads from, so a key changes exactly
+# when something upstream of it changed. Outputs are pickled under
+# <cache_dir>/<stage>-<key>.pkl; on a later run an unchanged stage is loaded
+# instead of recomputed, and stages upstream of it are never touched at all.
+#
+# Bump STAGE_VERSION when a stage's code changes its output.
+STAGE_VERSION = 2
+
+def stage_key(name: str, params: dict, upstream=()) -> str:
+    payload = json.dumps([name, STAGE_VERSION, params, list(upstream)], sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+class StageCache:
+    """Disk memo for stage outputs, with a per-run hit/miss report."""
+
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = Path(cache_dir)
+        self.report = []
+
+    def path(self, name: str, key: str) -> Path:
+        return self.cache_dir / f"{name}-{key}.pkl"
+
+    def get_or_compute(self, name: str, key: str, compute):
+        target = self.path(name, key)
+        t0 = time.perf_counter()
+        if target.exists():
+            try:
+                with open(target, "rb") as f:
+                    value = pickle.load(f)
+                self.report.append({"stage": name, "key": key, "hit": True, "seconds": time.perf_counter() - t0})
+                return value
+            except Exception:  # unreadable/corrupt entry -> recompute
+                pass
+
+        before = len(self.report)
+        value = compute()
+        # upstream stages pulled in by compute() report their own time
+        seconds = time.perf_counter() - t0 - sum(r["seconds"] for r in self.report[before:])
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_name(f"{target.name}.{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, target)
+        self.report.append({"stage": name, "key": key, "hit": False, "seconds": seconds})
+        return value
+
+def print_stage_report(report):
+    if not report:
+        return
+    hits = sum(r["hit"] for r in report)
+    print(f"Stages: {hits}/{len(report)} cache hits")
+    for r in report:
+        print(f"  {r['stage']:10s} {'hit ' if r['hit'] else 'miss'} {r['key']}  {r['seconds']:.2f}s")
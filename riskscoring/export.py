@@ -0,0 +1,316 @@
+import json
+import os
+from collections import deque
+from pathlib import Path
+import pandas as pd
+
+from .formats import COLUMNAR_SCHEMA, COLUMNAR_SUFFIX, COLUMNAR_VERSION, SUMMARY_SUFFIX
+from .indicators import default_indicator_specs
+
+# Columns written to every *_risk.json output. The drought indicators other than
+# the rain_<w>d sums (indicators.py) roughly double the files, so they are only
+# exported on request (risk_columns(indicators=True)). Frames are reindexed to
+# the chosen columns, so files written before a column existed read back with it empty.
+RISK_COLUMNS = ["station_name", "date", "population_2025", "rainfall_mm", "risk_class"]
+INDICATOR_COLUMNS = [name for name, spec in default_indicator_specs().items() if spec["kind"] != "sum"]
+
+def risk_columns(indicators=False) -> list:
+    return RISK_COLUMNS + INDICATOR_COLUMNS if indicators else RISK_COLUMNS
+
+# Trailing windows of the *_risk.summary.json sidecar's mean risk_class; the
+# sidecar and columnar layouts are described in formats.py. When both formats
+# are written, the columnar file goes first, so a sidecar at least as new as
+# it describes the same rows (extracting_jsons.latest_risk_classes relies on it).
+SUMMARY_WINDOWS = (4, 7, 30)
+RISK_FORMATS = ("records", "columnar", "both")
+
+def safe_station_name(stn: str) -> str:
+    return "".join(c for c in stn if c.isalnum() or c in (" ","_","-")).strip().replace(" ", "_")
+
+def station_risk_path(out_dir: Path, stn: str) -> Path:
+    return Path(out_dir) / f"{safe_station_name(stn)}_risk.json"
+
+def station_columnar_path(out_dir: Path, stn: str) -> Path:
+    return Path(out_dir) / f"{safe_station_name(stn)}_risk{COLUMNAR_SUFFIX}"
+
+def station_summary_path(out_path: Path) -> Path:
+    out_path = Path(out_path)
+    return out_path.with_name(out_path.stem + SUMMARY_SUFFIX)
+
+def _record_payloads(g: pd.DataFrame, columns=RISK_COLUMNS) -> list:
+    # one JSON object per row, formatted exactly as to_json(orient="records") writes it
+    g = g.reindex(columns=columns)
+    return [g.iloc[[k]].to_json(orient="records", date_format="iso")[1:-1] for k in range(len(g))]
+
+def write_station_summary(out_path: Path, latest: list, offsets: list, rows: int, windows=SUMMARY_WINDOWS):
+    """Write the sidecar for out_path from its latest records and their byte offsets."""
+    out_path = Path(out_path)
+    classes = [r["risk_class"] for r in latest]
+    summary = {
+        "rows": rows,
+        "file_size": out_path.stat().st_size,
+        "windows": list(windows),
+        "rolling_mean": {str(w): round(sum(classes[-w:]) / len(classes[-w:]), 5) if classes else None
+                         for w in windows},
+        "latest": latest,
+        "offsets": offsets,
+    }
+    with open(station_summary_path(out_path), "w") as f:
+        json.dump(summary, f)
+
+def read_station_summary(out_path: Path):
+    """The sidecar for out_path, or None if it is missing or was written for a different file size."""
+    path = station_summary_path(out_path)
+    if not path.exists():
+        return None
+    with open(path) as f:
+        summary = json.load(f)
+    if summary.get("file_size") != Path(out_path).stat().st_size:
+        return None
+    return summary
+
+def rebuild_station_summary(out_path: Path, windows=SUMMARY_WINDOWS):
+    """Rebuild a missing or stale sidecar by scanning the whole records file once."""
+    # to_json escapes non-ASCII, so one latin-1 char per byte keeps positions byte offsets
+    text = Path(out_path).read_bytes().decode("latin-1")
+    decoder = json.JSONDecoder()
+    records, offsets = [], []
+    pos = text.index("[") + 1
+    while True:
+        while text[pos] in " \t\r\n,":
+            pos += 1
+        if text[pos] == "]":
+            break
+        record, end = decoder.raw_decode(text, pos)
+        records.append(record)
+        offsets.append(pos)
+        pos = end
+    n_latest = max(windows)
+    write_station_summary(out_path, records[-n_latest:], offsets[-n_latest:], len(records), windows)
+
+def write_station_records(out_path: Path, g: pd.DataFrame, windows=SUMMARY_WINDOWS, columns=RISK_COLUMNS):
+    """Write the records JSON and its summary sidecar.
+
+    The body is split into the history before the last max(windows) rows and
+    those rows written one at a time, so their byte offsets are known. The
+    bytes are the same as a single to_json(orient="records").
+    """
+    n_latest = min(max(windows), len(g))
+    head = g.iloc[:len(g) - n_latest]
+    parts = [head.reindex(columns=columns).to_json(orient="records", date_format="iso")[1:-1]] if len(head) else []
+    tail = _record_payloads(g.iloc[len(g) - n_latest:], columns)
+
+    offsets = []
+    pos = 1 + sum(len(p.encode("utf-8")) + 1 for p in parts)  # "[" and the head plus its comma
+    for p in tail:
+        offsets.append(pos)
+        pos += len(p.encode("utf-8")) + 1
+
+    with open(out_path, "wb") as f:
+        f.write(("[" + ",".join(parts + tail) + "]").encode("utf-8"))
+    write_station_summary(out_path, [json.loads(p) for p in tail], offsets, len(g), windows)
+
+def append_station_records(out_path: Path, g: pd.DataFrame, windows=SUMMARY_WINDOWS, columns=RISK_COLUMNS):
+    """Append rows to an existing records-oriented JSON array without re-reading it.
+
+    Seeks to the closing bracket and splices the new records in, so the cost is
+    proportional to the new rows only. Creates the file if it does not exist.
+    The summary sidecar is carried forward from the previous one; without a
+    valid sidecar the file is re-read once to rebuild it.
+    """
+    out_path = Path(out_path)
+    if g.empty:
+        return
+    if not out_path.exists() or out_path.stat().st_size < 2:
+        write_station_records(out_path, g, windows, columns)
+        return
+
+    summary = read_station_summary(out_path)
+    records = _record_payloads(g, columns)
+    with open(out_path, "rb+") as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        # walk back over trailing whitespace to the closing bracket
+        while pos > 0:
+            pos -= 1
+            f.seek(pos)
+            ch = f.read(1)
+            if not ch.isspace():
+                break
+        if ch != b"]":
+            raise ValueError(f"{out_path} is not a JSON array")
+        f.seek(pos - 1)
+        empty = f.read(1) == b"["
+        f.seek(pos)
+        f.truncate()
+
+        offsets = []
+        start = pos if empty else pos + 1
+        for p in records:
+            offsets.append(start)
+            start += len(p.encode("utf-8")) + 1
+        f.write(((b"" if empty else b",") + ",".join(records).encode("utf-8") + b"]"))
+
+    if summary is None or max(summary["windows"]) < max(windows):
+        rebuild_station_summary(out_path, windows)
+        return
+    n_latest = max(windows)
+    latest = (summary["latest"] + [json.loads(p) for p in records])[-n_latest:]
+    offsets = (summary["offsets"] + offsets)[-n_latest:]
+    write_station_summary(out_path, latest, offsets, summary["rows"] + len(records), windows)
+
+def _json_values(s: pd.Series) -> list:
+    # plain Python numbers for json, NaN as null
+    return s.astype(object).where(s.notna(), None).tolist()
+
+def encode_columnar(g: pd.DataFrame, columns=RISK_COLUMNS) -> dict:
+    """A station's risk rows in the columnar layout (see COLUMNAR_SCHEMA)."""
+    # stable, so rows sharing a date keep their order and the file round-trips
+    g = g.sort_values("date", kind="stable").reindex(columns=columns)
+    dates = pd.to_datetime(g["date"]).dt.normalize()
+    start = dates.iloc[0] if len(g) else pd.Timestamp("1970-01-01")
+
+    constants, arrays = {}, {}
+    for col in columns:
+        if col == "date":
+            continue
+        values = g[col]
+        if len(g) and col != "risk_class" and values.nunique(dropna=False) == 1:
+            constants[col] = _json_values(values.iloc[:1])[0]
+        else:
+            arrays[col] = _json_values(values)
+
+    return {
+        "schema": COLUMNAR_SCHEMA,
+        "version": COLUMNAR_VERSION,
+        "rows": len(g),
+        "constants": constants,
+        "start_date": start.strftime("%Y-%m-%d"),
+        "day_offset": (dates - start).dt.days.astype(int).tolist(),
+        "columns": arrays,
+    }
+
+def decode_columnar(doc: dict, columns=RISK_COLUMNS) -> pd.DataFrame:
+    """Inverse of encode_columnar: the rows as a frame of the given columns."""
+    if doc.get("schema") != COLUMNAR_SCHEMA or doc.get("version") != COLUMNAR_VERSION:
+        raise ValueError(f"unsupported risk file schema {doc.get('schema')!r} v{doc.get('version')}")
+    n = doc["rows"]
+    data = {"date": pd.Timestamp(doc["start_date"]) + pd.to_timedelta(doc["day_offset"], unit="D")}
+    for col, value in doc["constants"].items():
+        data[col] = [value] * n
+    data.update(doc["columns"])
+    return pd.DataFrame(data).reindex(columns=columns)
+
+def write_station_columnar(out_path: Path, g: pd.DataFrame, columns=RISK_COLUMNS):
+    with open(out_path, "w") as f:
+        json.dump(encode_columnar(g, columns), f, separators=(",", ":"))
+
+def append_station_columnar(out_path: Path, g: pd.DataFrame, columns=RISK_COLUMNS):
+    """Add rows to a columnar file. The file is small, so it is simply re-encoded."""
+    out_path = Path(out_path)
+    if g.empty:
+        return
+    if out_path.exists():
+        with open(out_path) as f:
+            g = pd.concat([decode_columnar(json.load(f), columns), g.reindex(columns=columns)], ignore_index=True)
+    write_station_columnar(out_path, g, columns)
+
+def write_station_outputs(out_dir: Path, stn: str, g: pd.DataFrame, fmt="records", windows=SUMMARY_WINDOWS,
+                          columns=RISK_COLUMNS):
+    """Write a station's risk rows in the chosen format(s) (see RISK_FORMATS)."""
+    if fmt in ("columnar", "both"):
+        write_station_columnar(station_columnar_path(out_dir, stn), g, columns)
+    if fmt in ("records", "both"):
+        write_station_records(station_risk_path(out_dir, stn), g, windows, columns)
+
+def append_station_outputs(out_dir: Path, stn: str, g: pd.DataFrame, fmt="records", windows=SUMMARY_WINDOWS,
+                           columns=RISK_COLUMNS):
+    if fmt in ("columnar", "both"):
+        append_station_columnar(station_columnar_path(out_dir, stn), g, columns)
+    if fmt in ("records", "both"):
+        append_station_records(station_risk_path(out_dir, stn), g, windows, columns)
+
+class StationStreamWriter:
+    """One station's outputs, fed record by record while the combined file streams.
+
+    Records arrive as the exact JSON text of each row, so they are serialised
+    once for both files. The records file and its sidecar offsets are built
+    as bytes are written; the columnar file needs the whole station and keeps
+    only that station's rows. Files land in place via os.replace on close.
+    """
+
+    def __init__(self, out_dir: Path, stn: str, fmt="records", windows=SUMMARY_WINDOWS, columns=RISK_COLUMNS):
+        self.stn, self.fmt, self.windows, self.columns = stn, fmt, windows, columns
+        self.records_path = station_risk_path(out_dir, stn)
+        self.columnar_path = station_columnar_path(out_dir, stn)
+        self.rows = 0
+        self.latest = deque(maxlen=max(windows))
+        self.frames = []
+        self.f = None
+        if fmt in ("records", "both"):
+            self.tmp = self.records_path.with_name(self.records_path.name + ".tmp")
+            self.f = open(self.tmp, "wb")
+            self.f.write(b"[")
+            self.pos = 1
+
+    def write(self, frame: pd.DataFrame, lines: list):
+        if self.f is not None:
+            for line in lines:
+                data = line.encode("utf-8")
+                if self.rows:
+                    self.f.write(b",")
+                    self.pos += 1
+                self.latest.append((self.pos, line))
+                self.f.write(data)
+                self.pos += len(data)
+                self.rows += 1
+        if self.fmt in ("columnar", "both"):
+            self.frames.append(frame)
+
+    def close(self):
+        if self.frames:
+            tmp = self.columnar_path.with_name(self.columnar_path.name + ".tmp")
+            write_station_columnar(tmp, pd.concat(self.frames, ignore_index=True), self.columns)
+            os.replace(tmp, self.columnar_path)
+        if self.f is not None:
+            self.f.write(b"]")
+            self.f.close()
+            os.replace(self.tmp, self.records_path)
+            write_station_summary(self.records_path, [json.loads(line) for _, line in self.latest],
+                                  [pos for pos, _ in self.latest], self.rows, self.windows)
+
+def stream_risk_outputs(frame: pd.DataFrame, out_dir: Path, combined_path: Path, fmt="records",
+                        windows=SUMMARY_WINDOWS, chunk_rows=50_000, columns=RISK_COLUMNS):
+    """Single pass over frame (sorted by station, date): NDJSON combined file plus per-station files.
+
+    Each chunk of chunk_rows is serialised once with to_json(lines=True); the
+    lines go to the combined file and to the current station's writer, so the
+    export holds at most one chunk of text (plus one station's rows for the
+    columnar format). The combined file is written to a temp name and renamed
+    when complete. Returns the number of stations written.
+    """
+    combined_path = Path(combined_path)
+    tmp = combined_path.with_name(combined_path.name + ".tmp")
+    writer = None
+    stations = 0
+    with open(tmp, "w", encoding="utf-8") as out:
+        for start in range(0, len(frame), chunk_rows):
+            chunk = frame.iloc[start:start + chunk_rows].reindex(columns=columns)
+            lines = chunk.to_json(orient="records", lines=True, date_format="iso").splitlines()
+            out.write("\n".join(lines) + "\n")
+
+            # stations are contiguous, so split the chunk where the name changes
+            names = chunk["station_name"].to_numpy()
+            starts = (chunk["station_name"] != chunk["station_name"].shift()).to_numpy().nonzero()[0]
+            bounds = starts.tolist() + [len(names)]
+            for a, b in zip(bounds[:-1], bounds[1:]):
+                if writer is None or writer.stn != names[a]:
+                    if writer is not None:
+                        writer.close()
+                    writer = StationStreamWriter(out_dir, names[a], fmt, windows, columns)
+                    stations += 1
+                writer.write(chunk.iloc[a:b], lines[a:b])
+    if writer is not None:
+        writer.close()
+    os.replace(tmp, combined_path)
+    return stations
@@ -0,0 +1,114 @@
+import re
+from pathlib import Path
+import numpy as np
+
+# A fitted RandomForestClassifier flattened into contiguous node arrays, all
+# trees back to back, with a batch evaluator that walks every tree for a block
+# of rows at once. Scoring needs only NumPy, and the arrays round-trip through
+# a single .npz, so serving never imports or unpickles scikit-learn.
+#
+# The evaluator pays one NumPy call per depth level rather than per tree, which
+# makes it far cheaper than scikit-learn's per-tree dispatch on the few rows an
+# incremental run scores per station; on bulk batches scikit-learn's compiled
+# traversal is several times faster, so full runs score with the fitted forest.
+#
+# Probabilities follow scikit-learn's arithmetic: leaf values are taken as its
+# DecisionTreeClassifier.predict_proba uses them, and trees are summed in
+# estimator order before one division, as RandomForestClassifier does.
+# bench_forest.py checks them to 1e-12 and that the risk classes agree.
+
+def sklearn_normalises_leaves(version: str) -> bool:
+    """
+    Before scikit-learn 1.4 tree_.value held weighted class counts and
+    predict_proba divided them per row; from 1.4 it holds the class fractions
+    and predict_proba returns them as they are (dividing again is off by an ulp).
+    """
+    major, minor = (int(p) for p in re.match(r"(\d+)\.(\d+)", version).groups())
+    return (major, minor) < (1, 4)
+
+class CompiledForest:
+    def __init__(self, feature, threshold, left, right, value, roots, classes, max_depth):
+        self.feature = np.ascontiguousarray(feature, dtype=np.intp)
+        self.threshold = np.ascontiguousarray(threshold, dtype=np.float64)
+        self.left = np.ascontiguousarray(left, dtype=np.intp)
+        self.right = np.ascontiguousarray(right, dtype=np.intp)
+        self.value = np.ascontiguousarray(value, dtype=np.float64)   # (nodes, classes) class fractions
+        self.roots = np.ascontiguousarray(roots, dtype=np.intp)
+        self.classes_ = np.asarray(classes)
+        self.max_depth = int(max_depth)
+        # children interleaved as (right, left), so a step is one gather at 2 * node + go_left
+        self.children = np.empty(2 * len(self.left), dtype=np.intp)
+        self.children[0::2], self.children[1::2] = self.right, self.left
+
+    @classmethod
+    def from_sklearn(cls, rf):
+        """Flatten rf.estimators_; child indices are rebased to the global node arrays."""
+        import sklearn
+
+        normalise = sklearn_normalises_leaves(sklearn.__version__)
+        feature, threshold, left, right, value, roots = [], [], [], [], [], []
+        offset, max_depth = 0, 0
+        for est in rf.estimators_:
+            t = est.tree_
+            leaf = t.children_left == -1
+            roots.append(offset)
+            feature.append(np.where(leaf, 0, t.feature))
+            threshold.append(t.threshold)
+            # a leaf points at itself, so extra steps past its depth are no-ops
+            own = np.arange(t.node_count) + offset
+            left.append(np.where(leaf, own, t.children_left + offset))
+            right.append(np.where(leaf, own, t.children_right + offset))
+            # as DecisionTreeClassifier.predict_proba uses them
+            v = t.value[:, 0, :]
+            if normalise:
+                total = v.sum(axis=1, keepdims=True)
+                total[total == 0] = 1.0
+                v = v / total
+            value.append(v)
+            offset += t.node_count
+            max_depth = max(max_depth, t.max_depth)
+
+        return cls(np.concatenate(feature), np.concatenate(threshold), np.concatenate(left),
+                   np.concatenate(right), np.concatenate(value), roots, rf.classes_, max_depth)
+
+    @property
+    def n_estimators(self):
+        return len(self.roots)
+
+    def apply(self, X):
+        """Leaf node of every tree for every row: (n_trees, n_rows) global node ids."""
+        # scikit-learn compares float32 features against float64 thresholds
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        flat = X.ravel()
+        row_start = (np.arange(len(X)) * X.shape[1])[None, :]
+        node = np.repeat(self.roots[:, None], len(X), axis=1)
+        for _ in range(self.max_depth):
+            go_left = flat[row_start + self.feature[node]] <= self.threshold[node]
+            node = self.children[2 * node + go_left]
+        return node
+
+    def predict_proba(self, X, batch_rows=1024):
+        """Same as RandomForestClassifier.predict_proba: the mean of the trees' leaf distributions."""
+        X = np.asarray(X)
+        out = np.empty((len(X), len(self.classes_)), dtype=np.float64)
+        for start in range(0, len(X), batch_rows):
+            leaves = self.apply(X[start:start + batch_rows])
+            # accumulate tree by tree, in estimator order, like scikit-learn
+            proba = np.zeros((leaves.shape[1], len(self.classes_)), dtype=np.float64)
+            for tree_leaves in leaves:
+                proba += self.value[tree_leaves]
+            out[start:start + batch_rows] = proba / self.n_estimators
+        return out
+
+    def save(self, path: Path):
+        np.savez(path, feature=self.feature, threshold=self.threshold, left=self.left, right=self.right,
+                 value=self.value, roots=self.roots, classes=self.classes_, max_depth=self.max_depth)
+
+    @classmethod
+    def load(cls, path: Path):
+        with np.load(path, allow_pickle=False) as z:
+            return cls(z["feature"], z["threshold"], z["left"], z["right"], z["value"],
+                       z["roots"], z["classes"], z["max_depth"])
+
+def compile_forest(rf) -> CompiledForest:
+    return CompiledForest.from_sklearn(rf)
@@ -0,0 +1,15 @@
+# File-name suffixes and schema tags of the per-station outputs, shared by the
+# writers (export.py) and the lightweight readers outside the package
+# (extracting_jsons.py). Constants only, so readers import nothing heavy.
+
+# Every *_risk.json gets a small *_risk.summary.json sidecar with the latest
+# records, the mean risk_class over trailing windows and the byte offset of
+# each latest record, so readers never have to parse the full history.
+SUMMARY_SUFFIX = ".summary.json"
+
+# Compact alternative to the records files: *_risk.cols.json holds one array per
+# column, columns that never change within a station hoisted to "constants", and
+# dates as whole-day offsets from start_date. Bump the version on layout changes.
+COLUMNAR_SCHEMA = "station-risk-columnar"
+COLUMNAR_VERSION = 1
+COLUMNAR_SUFFIX = ".cols.json"
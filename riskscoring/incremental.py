@@ -0,0 +1,150 @@
+import json
+import pickle
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+from .climatology import Climatology
+from .export import RISK_COLUMNS, SUMMARY_WINDOWS, append_station_outputs
+from .indicators import compute_indicators, default_indicator_specs, history_days
+from .panel import ROLLING_MIN_COVERAGE, ROLLING_WINDOWS, StationPanel
+
+# Persisted scoring state lets a daily refresh score only the rows that arrived
+# since the last run instead of recomputing 2015-today for every station.
+#
+#   state.json        per-station trailing window (the longest history any indicator
+#                     needs, in days), last scored date, population, plus the risk_prob
+#                     bin edges, the rolling window settings and the indicator specs
+#   climatology.npz   per-station rainfall moments for rain_anomaly (climatology.py)
+#   model.pkl         the classifier (a forest.CompiledForest, so scoring needs no scikit-learn)
+STATE_FILE = "state.json"
+MODEL_FILE = "model.pkl"
+CLIMATOLOGY_FILE = "climatology.npz"
+
+def risk_bin_edges(risk_prob: pd.Series) -> list:
+    """Interior edges of the 1..5 percentile bins used by the full run."""
+    return [float(risk_prob.quantile(q)) for q in (0.2, 0.4, 0.6, 0.8)]
+
+def classify(risk_prob: np.ndarray, edges) -> np.ndarray:
+    # same bins as ceil(pct_rank * 5) against the full-run distribution
+    return np.searchsorted(np.asarray(edges), risk_prob, side="left").astype(int) + 1
+
+def rolling_settings(state: dict):
+    """(windows, min_coverage) the state was built with; JSON turns int dict keys into strings."""
+    rolling = state.get("rolling", {})
+    windows = tuple(rolling.get("windows", ROLLING_WINDOWS))
+    cov = rolling.get("min_coverage", ROLLING_MIN_COVERAGE)
+    if isinstance(cov, dict):
+        cov = {int(w): c for w, c in cov.items()}
+    return windows, cov
+
+def indicator_settings(state: dict) -> dict:
+    """The indicator specs the state was built with; states without them get the defaults for their windows."""
+    return state.get("indicators") or default_indicator_specs(rolling_settings(state)[0])
+
+def build_state(df: pd.DataFrame, rf, features, risk_prob: pd.Series, pop_min, pop_ptp, state_dir: Path,
+                rolling_windows=ROLLING_WINDOWS, min_coverage=ROLLING_MIN_COVERAGE, climatology=None,
+                indicator_specs=None):
+    """Snapshot everything incremental scoring needs after a full run."""
+    state_dir = Path(state_dir)
+    state_dir.mkdir(parents=True, exist_ok=True)
+    indicator_specs = indicator_specs or default_indicator_specs(rolling_windows)
+    window_days = history_days(indicator_specs)
+
+    stations = {}
+    for stn, g in df.groupby("station_name", sort=True):
+        g = g.sort_values("date")
+        tail = g[g["date"] > g["date"].iloc[-1] - pd.Timedelta(days=window_days)]
+        stations[stn] = {
+            "last_date": g["date"].iloc[-1].strftime("%Y-%m-%d"),
+            "population_2025": float(g["population_2025"].iloc[-1]),
+            "window": [[d.strftime("%Y-%m-%d"), float(r)] for d, r in zip(tail["date"], tail["rainfall_mm"])],
+        }
+
+    state = {
+        "features": list(features),
+        "risk_edges": risk_bin_edges(risk_prob),
+        "pop_min": float(pop_min),
+        "pop_ptp": float(pop_ptp),
+        "rolling": {"windows": list(rolling_windows), "min_coverage": min_coverage},
+        "indicators": indicator_specs,
+        "stations": stations,
+    }
+    with open(state_dir / STATE_FILE, "w") as f:
+        json.dump(state, f)
+    with open(state_dir / MODEL_FILE, "wb") as f:
+        pickle.dump(rf, f)
+    (climatology or Climatology.from_frame(df)).save(state_dir / CLIMATOLOGY_FILE)
+
+def load_state(state_dir: Path):
+    state_dir = Path(state_dir)
+    if not (state_dir / STATE_FILE).exists():
+        raise FileNotFoundError(f"No scoring state in {state_dir}; run a full scoring pass first")
+    with open(state_dir / STATE_FILE) as f:
+        state = json.load(f)
+    with open(state_dir / MODEL_FILE, "rb") as f:
+        rf = pickle.load(f)
+    if not (state_dir / CLIMATOLOGY_FILE).exists():
+        raise FileNotFoundError(f"No climatology in {state_dir}; run a full scoring pass first")
+    return state, rf, Climatology.load(state_dir / CLIMATOLOGY_FILE)
+
+def score_station_rows(st: dict, new: pd.DataFrame, state: dict, rf, climatology: Climatology) -> pd.DataFrame:
+    """Score rows newer than the station's last scored date, updating `st` and `climatology` in place."""
+    new = new.sort_values("date").reset_index(drop=True)
+    _, min_coverage = rolling_settings(state)
+    specs = indicator_settings(state)
+    stn = new["station_name"].iloc[0]
+
+    # fold the batch into the station's moments first, so anomalies and the deficit's
+    # expected rainfall see the same history a full run would
+    climatology.update(new["station_name"], new["date"], new["rainfall_mm"])
+
+    n_prev = len(st["window"])
+    history = pd.DataFrame({
+        "station_name": stn,
+        "date": pd.to_datetime([d for d, _ in st["window"]] + list(new["date"])),
+        "rainfall_mm": [r for _, r in st["window"]] + new["rainfall_mm"].tolist(),
+    })
+    # the trailing window covers the longest history any indicator needs, so these match the full run
+    panel = StationPanel.from_frame(history, "rainfall_mm")
+    for name, arr in compute_indicators(panel, specs, min_coverage, climatology.monthly_means(panel.stations)).items():
+        new[name] = panel.gather(arr)[n_prev:]
+    new["population_2025"] = st["population_2025"]
+    new["rain_anomaly"] = climatology.anomaly(new["station_name"], new["date"], new["rainfall_mm"])
+
+    window = st["window"] + [[d.strftime("%Y-%m-%d"), float(r)] for d, r in zip(new["date"], new["rainfall_mm"])]
+    st["last_date"] = new["date"].iloc[-1].strftime("%Y-%m-%d")
+    cutoff = (new["date"].iloc[-1] - pd.Timedelta(days=history_days(specs))).strftime("%Y-%m-%d")
+    st["window"] = [entry for entry in window if entry[0] > cutoff]
+
+    features = state["features"]
+    scored = new.dropna(subset=features).copy()
+    if scored.empty:
+        return scored
+    scored["risk_prob"] = rf.predict_proba(scored[features])[:, 1]
+    scored["risk_class"] = classify(scored["risk_prob"].to_numpy(), state["risk_edges"])
+    return scored
+
+def run_incremental(df: pd.DataFrame, state_dir: Path, out_dir: Path, summary_windows=SUMMARY_WINDOWS,
+                    risk_format="records", columns=RISK_COLUMNS) -> int:
+    """Score and append only rows dated after each station's last scored day."""
+    state, rf, climatology = load_state(state_dir)
+    total = 0
+    for stn, g in df.groupby("station_name", sort=True):
+        st = state["stations"].get(stn)
+        if st is None:
+            print(f"Warning: {stn} has no scoring state; include it in a full run first")
+            continue
+        new = g[g["date"] > pd.Timestamp(st["last_date"])]
+        if new.empty:
+            continue
+        scored = score_station_rows(st, new, state, rf, climatology)
+        append_station_outputs(out_dir, stn, scored, risk_format, summary_windows, columns)
+        total += len(scored)
+        print(f"  {stn}: scored {len(scored)} new rows through {st['last_date']}")
+
+    with open(Path(state_dir) / STATE_FILE, "w") as f:
+        json.dump(state, f)
+    climatology.save(Path(state_dir) / CLIMATOLOGY_FILE)
+    print(f"Incremental run scored {total} new rows")
+    return total
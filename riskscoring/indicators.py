@@ -0,0 +1,160 @@
+import numpy as np
+import pandas as pd
+
+from .panel import ROLLING_MIN_COVERAGE, ROLLING_WINDOWS, StationPanel
+
+# Drought indicators computed together on a StationPanel. Each indicator is a
+# declarative spec, {"kind": ..., **params}, and each kind is a function of a
+# DailyScan, which builds the cumulative arrays the kinds share (rain, observed
+# days, wet days per threshold, climatological expectation) once, along the day
+# axis, for all stations at once. Adding an indicator is a new spec; adding a
+# new kind of indicator is one function in INDICATOR_KINDS. The "sum" kind is
+# panel.calendar_rolling_sums itself, so rain_<w>d has one implementation.
+#
+# Windowed kinds follow the calendar_rolling_sums coverage rule: NaN where fewer
+# than min_coverage of the window's days were observed. Day counts (days since
+# rain, dry spells) are capped at max_days and are NaN when an unobserved day
+# falls inside the span they count, since rain could have fallen on it.
+SIGNIFICANT_RAIN_MM = 1.0   # BoM rain-day threshold
+MAX_COUNT_DAYS = 365
+
+def default_indicator_specs(windows=ROLLING_WINDOWS, wet_windows=(30, 90), deficit_windows=(90, 180, 365),
+                            threshold=SIGNIFICANT_RAIN_MM) -> dict:
+    specs = {f"rain_{w}d": {"kind": "sum", "window": w} for w in windows}
+    specs.update({f"wet_days_{w}d": {"kind": "wet_days", "window": w, "threshold": threshold} for w in wet_windows})
+    specs.update({f"deficit_{w}d": {"kind": "deficit", "window": w} for w in deficit_windows})
+    specs["days_since_rain"] = {"kind": "days_since_rain", "threshold": threshold}
+    specs["dry_spell"] = {"kind": "dry_spell", "threshold": threshold}
+    return specs
+
+def history_days(specs) -> int:
+    """Calendar days of history every spec needs to give the same value as over the full record."""
+    return max((spec.get("window", spec.get("max_days", MAX_COUNT_DAYS)) for spec in specs.values()), default=1)
+
+class DailyScan:
+    """
+    Shared cumulative arrays over a panel, each built on first use.
+    monthly_means ([stations, 12], e.g. Climatology.monthly_means) replaces
+    the panel's own monthly means as the expected rainfall.
+    """
+
+    def __init__(self, panel: StationPanel, min_coverage=ROLLING_MIN_COVERAGE, monthly_means=None):
+        self.panel = panel
+        self.min_coverage = min_coverage
+        self.monthly_means = monthly_means
+        self.observed = panel.mask & ~np.isnan(panel.values)
+        self.rain = np.where(self.observed, panel.values, 0.0)
+        self.days = np.arange(panel.shape[1])
+        self._cache = {}
+
+    def _cached(self, key, make):
+        if key not in self._cache:
+            self._cache[key] = make()
+        return self._cache[key]
+
+    def cumulative(self, key, make) -> np.ndarray:
+        """[stations, days + 1] running total of make(), with a leading zero column."""
+        def build():
+            arr = make()
+            c = np.zeros((arr.shape[0], arr.shape[1] + 1))
+            np.cumsum(arr, axis=1, out=c[:, 1:])
+            return c
+        return self._cached(("cum", key), build)
+
+    def window(self, key, make, w: int) -> np.ndarray:
+        """Total of make() over the w calendar days ending at each day."""
+        c = self.cumulative(key, make)
+        end = self.days + 1
+        return c[:, end] - c[:, np.maximum(end - w, 0)]
+
+    def coverage(self, w: int):
+        """(observed days in each window, windows meeting min_coverage)."""
+        n = self.window("observed", lambda: self.observed, w)
+        cov = (self.min_coverage.get(w, ROLLING_MIN_COVERAGE) if isinstance(self.min_coverage, dict)
+               else self.min_coverage)
+        return n, (n > 0) & (n >= cov * w)
+
+    def wet(self, threshold: float) -> np.ndarray:
+        return self._cached(("wet", threshold), lambda: self.observed & (self.rain >= threshold))
+
+    def last_index(self, key, flags) -> np.ndarray:
+        """Index of the latest day <= each day where flags() holds, -1 if none (a running max)."""
+        return self._cached(("last", key), lambda: np.maximum.accumulate(
+            np.where(flags(), self.days, -1), axis=1))
+
+    def expected_daily(self) -> np.ndarray:
+        """Climatological rainfall per station-day: the station's mean for that calendar month."""
+        def build():
+            mean = self.panel.monthly_stats()[1] if self.monthly_means is None else self.monthly_means
+            return np.nan_to_num(mean[:, self.panel.months() - 1])
+        return self._cached("expected", build)
+
+    def rolling_sums(self, windows) -> dict:
+        """panel.calendar_rolling_sums for the windows not computed yet, in one pass."""
+        todo = [w for w in windows if ("sum", w) not in self._cache]
+        if todo:
+            for w, sums in self.panel.calendar_rolling_sums(todo, self.min_coverage).items():
+                self._cache[("sum", w)] = sums
+        return {w: self._cache[("sum", w)] for w in windows}
+
+def _sum(scan: DailyScan, window: int):
+    return scan.rolling_sums((window,))[window]
+
+def _wet_days(scan: DailyScan, window: int, threshold=SIGNIFICANT_RAIN_MM):
+    _, ok = scan.coverage(window)
+    return np.where(ok, scan.window(("wet", threshold), lambda: scan.wet(threshold), window), np.nan)
+
+def _deficit(scan: DailyScan, window: int):
+    """Climatological rainfall over the window minus observed, with missing days filled at the window's mean."""
+    n, ok = scan.coverage(window)
+    expected = scan.window("expected", scan.expected_daily, window)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        actual = scan.window("rain", lambda: scan.rain, window) * window / n
+    return np.where(ok, np.round(expected - actual, 6), np.nan)
+
+def _days_since_rain(scan: DailyScan, threshold=SIGNIFICANT_RAIN_MM, max_days=MAX_COUNT_DAYS):
+    """
+    Calendar days since the last day with at least threshold mm (0 on such a
+    day), capped at max_days. NaN if a day since then (or in the last max_days
+    days, once capped) was not observed.
+    """
+    last = scan.last_index(("wet", threshold), lambda: scan.wet(threshold))
+    missing = scan.last_index("missing", lambda: ~scan.observed)
+    known = missing < np.maximum(last, scan.days - max_days + 1)
+    return np.where(known, np.minimum(scan.days - last, max_days), np.nan)
+
+def _dry_spell(scan: DailyScan, threshold=SIGNIFICANT_RAIN_MM, max_days=MAX_COUNT_DAYS):
+    """
+    Consecutive observed days below threshold ending at each day, capped at
+    max_days; a wet or missing day ends the spell.
+    """
+    last = scan.last_index(("break", threshold), lambda: scan.wet(threshold) | ~scan.observed)
+    return np.minimum(scan.days - last, max_days).astype(np.float64)
+
+INDICATOR_KINDS = {
+    "sum": _sum,
+    "wet_days": _wet_days,
+    "deficit": _deficit,
+    "days_since_rain": _days_since_rain,
+    "dry_spell": _dry_spell,
+}
+
+def compute_indicators(panel: StationPanel, specs=None, min_coverage=ROLLING_MIN_COVERAGE,
+                       monthly_means=None) -> dict:
+    """{name: [stations, days] array} for every spec."""
+    specs = default_indicator_specs() if specs is None else specs
+    scan = DailyScan(panel, min_coverage, monthly_means)
+    scan.rolling_sums([spec["window"] for spec in specs.values() if spec["kind"] == "sum"])
+    out = {}
+    for name, spec in specs.items():
+        params = {k: v for k, v in spec.items() if k != "kind"}
+        out[name] = INDICATOR_KINDS[spec["kind"]](scan, **params)
+    return out
+
+def add_indicators(df: pd.DataFrame, specs=None, min_coverage=ROLLING_MIN_COVERAGE) -> pd.DataFrame:
+    """The long frame with one column per indicator spec."""
+    df = df.copy()
+    panel = StationPanel.from_frame(df, "rainfall_mm")
+    for name, arr in compute_indicators(panel, specs, min_coverage).items():
+        df[name] = panel.gather(arr)
+    return df
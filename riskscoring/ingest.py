@@ -0,0 +1,327 @@
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+COLUMNS = ["station_num", "station_name", "date", "rainfall_mm"]
+
+MONTH_FIX = {
+    # handle common variants; pandas uses %B for English month names
+    "jan": "January", "january": "January",
+    "feb": "February", "february": "February",
+    "mar": "March", "march": "March",
+    "apr": "April", "april": "April",
+    "may": "May",
+    "jun": "June", "june": "June",
+    "jul": "July", "july": "July",
+    "aug": "August", "august": "August",
+    "sep": "September", "sept": "September", "september": "September",
+    "oct": "October", "october": "October",
+    "nov": "November", "november": "November",
+    "dec": "December", "december": "December",
+}
+
+MONTH_NUM = {
+    "january": 1, "february": 2, "march": 3, "april": 4,
+    "may": 5, "june": 6, "july": 7, "august": 8,
+    "september": 9, "october": 10, "november": 11, "december": 12,
+}
+
+def norm_month_name(name: str) -> str:
+    if not isinstance(name, str):
+        name = str(name)
+    key = name.strip().lower()
+    return MONTH_FIX.get(key, name.strip())
+
+def month_number(name) -> int:
+    """Month number 1..12 for a (possibly abbreviated) month name, 0 if unknown."""
+    return MONTH_NUM.get(norm_month_name(name).lower(), 0)
+
+def empty_station_frame() -> pd.DataFrame:
+    return pd.DataFrame(columns=COLUMNS)
+
+def flatten_station_json_reference(path: Path) -> pd.DataFrame:
+    """Original row-by-row flattener (one pd.to_datetime per day).
+
+    Kept as the reference implementation for benchmarks and equivalence checks;
+    use flatten_station_json everywhere else.
+    """
+    with open(path, "r") as f:
+        data = json.load(f)
+
+    station_num  = str(data.get("stationNum", "")).strip()
+    station_name = str(data.get("stationName", "")).strip()
+    years = data.get("years", {})
+
+    rows = []
+    for year, months in years.items():
+        for month_name_raw, days in months.items():
+            month_name = norm_month_name(month_name_raw)
+            for day_str, rainfall in (days or {}).items():
+                # build date safely
+                try:
+                    day_int = int(day_str)
+                except Exception:
+                    continue
+                # allow floats/ints/strings for rainfall
+                try:
+                    rain_val = float(rainfall)
+                except Exception:
+                    continue
+
+                # Parse "YYYY-MonthName-DD" with %B
+                date = pd.to_datetime(f"{year}-{month_name}-{day_int}",
+                                      format="%Y-%B-%d", errors="coerce")
+                if pd.isna(date):
+                    continue
+
+                rows.append({
+                    "station_num": station_num,
+                    "station_name": station_name,
+                    "date": date,
+                    "rainfall_mm": rain_val,
+                })
+
+    if not rows:
+        return empty_station_frame()
+
+    df = pd.DataFrame(rows).sort_values("date").reset_index(drop=True)
+    return df
+
+def dates_from_parts(year, month, day) -> pd.Series:
+    """One vectorized parse of YYYYMMDD keys; impossible dates (e.g. 30 Feb) become NaT."""
+    keys = (np.asarray(year, dtype=np.int64) * 10000
+            + np.asarray(month, dtype=np.int64) * 100
+            + np.asarray(day, dtype=np.int64))
+    return pd.to_datetime(pd.Series(keys).astype(str), format="%Y%m%d", errors="coerce")
+
+def flatten_station_data(data: dict) -> pd.DataFrame:
+    """Columnar flatten of an already-decoded station dict.
+
+    Walks the nested years->MonthName->day mapping once, collecting year/month/day/value
+    into flat arrays, then builds every date in a single vectorized call.
+    """
+    station_num  = str(data.get("stationNum", "")).strip()
+    station_name = str(data.get("stationName", "")).strip()
+    years = data.get("years", {}) or {}
+
+    year_l, month_l, day_l, rain_l = [], [], [], []
+    for year, months in years.items():
+        try:
+            year_int = int(year)
+        except Exception:
+            continue
+        for month_name_raw, days in (months or {}).items():
+            month_int = month_number(month_name_raw)
+            if not month_int:
+                continue
+            for day_str, rainfall in (days or {}).items():
+                try:
+                    day_int = int(day_str)
+                    rain_val = float(rainfall)
+                except Exception:
+                    continue
+                if not 1 <= day_int <= 31:
+                    continue
+                year_l.append(year_int)
+                month_l.append(month_int)
+                day_l.append(day_int)
+                rain_l.append(rain_val)
+
+    if not rain_l:
+        return empty_station_frame()
+
+    dates = dates_from_parts(year_l, month_l, day_l)
+    rain = np.asarray(rain_l, dtype=np.float64)
+
+    valid = dates.notna().to_numpy()
+    dates = dates[valid].to_numpy()
+    rain = rain[valid]
+    if len(rain) == 0:
+        return empty_station_frame()
+
+    order = np.argsort(dates, kind="stable")
+    n = len(order)
+    return pd.DataFrame({
+        "station_num": np.full(n, station_num, dtype=object),
+        "station_name": np.full(n, station_name, dtype=object),
+        "date": dates[order],
+        "rainfall_mm": rain[order],
+    }).astype({"station_num": "str", "station_name": "str"})
+
+def flatten_station_json(path: Path) -> pd.DataFrame:
+    """Flatten ONE raw station JSON (nested years->MonthName->day) to rows."""
+    with open(path, "r") as f:
+        data = json.load(f)
+    return flatten_station_data(data)
+
+# --------- BoM daily rainfall CSV (IDCJAC0009) ---------
+BOM_CSV_COLUMNS = {
+    "Bureau of Meteorology station number": "station_num",
+    "Year": "year",
+    "Month": "month",
+    "Day": "day",
+    "Rainfall amount (millimetres)": "rainfall_mm",
+    "Period over which rainfall was measured (days)": "period_days",
+    "Quality": "quality",
+}
+BOM_CSV_DTYPES = {
+    "Bureau of Meteorology station number": str,
+    "Year": np.int32,
+    "Month": np.int32,
+    "Day": np.int32,
+    "Rainfall amount (millimetres)": np.float64,
+    "Period over which rainfall was measured (days)": np.float64,
+    "Quality": str,
+}
+ACCUMULATION_MODES = ("spread", "keep", "drop")
+
+def _apply_accumulations(chunk: pd.DataFrame, mode: str) -> pd.DataFrame:
+    """Handle multi-day totals (period > 1) reported on the last day of the period.
+
+    spread: divide the total evenly over the period, filling the preceding
+            missing days (only consecutive, still-missing days of the same station;
+            the total is preserved if fewer days than the period can be filled)
+    keep:   leave the total on the reporting day
+    drop:   treat the reporting day as missing
+    """
+    period = chunk["period_days"].to_numpy()
+    multi = np.flatnonzero((period > 1) & chunk["rainfall_mm"].notna().to_numpy())
+    if mode == "keep" or len(multi) == 0:
+        return chunk
+    rain = chunk["rainfall_mm"].to_numpy(copy=True)
+    if mode == "drop":
+        rain[multi] = np.nan
+    else:
+        dates = chunk["date"].to_numpy()
+        stations = chunk["station_num"].to_numpy()
+        one_day = np.timedelta64(1, "D")
+        for i in multi:
+            n_fill = 0
+            for k in range(1, int(period[i])):
+                j = i - k
+                if (j < 0 or stations[j] != stations[i] or not np.isnan(rain[j])
+                        or dates[i] - dates[j] != k * one_day):
+                    break
+                n_fill = k
+            # spread over the days we can actually place it on so the total is preserved
+            rain[i - n_fill:i + 1] = rain[i] / (n_fill + 1)
+    chunk = chunk.copy()
+    chunk["rainfall_mm"] = rain
+    return chunk
+
+def iter_bom_csv(path: Path, chunksize: int = 100_000, station_name: str = None,
+                 accumulations: str = "spread", max_carry: int = 400):
+    """Stream a BoM daily rainfall CSV as typed chunks.
+
+    Yields DataFrames with station_num, station_name, date, rainfall_mm, period_days
+    and quality. Memory is bounded by `chunksize`: only the trailing run of missing
+    days (which a multi-day total in the next chunk may still fill) is carried
+    between chunks, capped at `max_carry` rows.
+    """
+    if accumulations not in ACCUMULATION_MODES:
+        raise ValueError(f"accumulations must be one of {ACCUMULATION_MODES}")
+    carry = None
+    reader = pd.read_csv(path, usecols=list(BOM_CSV_COLUMNS), dtype=BOM_CSV_DTYPES,
+                         chunksize=chunksize)
+    for raw in reader:
+        raw = raw.rename(columns=BOM_CSV_COLUMNS)
+        chunk = pd.DataFrame({
+            "station_num": raw["station_num"].str.strip().to_numpy(),
+            "station_name": station_name or "",
+            "date": dates_from_parts(raw["year"], raw["month"], raw["day"]).to_numpy(),
+            "rainfall_mm": raw["rainfall_mm"].to_numpy(),
+            "period_days": raw["period_days"].to_numpy(),
+            "quality": raw["quality"].to_numpy(),
+        })
+        chunk = chunk[chunk["date"].notna()]
+        if not station_name:
+            chunk["station_name"] = chunk["station_num"]
+        if carry is not None:
+            chunk = pd.concat([carry, chunk], ignore_index=True)
+        chunk = _apply_accumulations(chunk.reset_index(drop=True), accumulations)
+
+        # hold back trailing missing days; a total early in the next chunk may cover them
+        missing = chunk["rainfall_mm"].isna().to_numpy()
+        n_tail = 0
+        while n_tail < min(len(chunk), max_carry) and missing[len(chunk) - 1 - n_tail]:
+            n_tail += 1
+        carry = chunk.iloc[len(chunk) - n_tail:] if n_tail else None
+        out = chunk.iloc[:len(chunk) - n_tail]
+        if len(out):
+            yield out
+    if carry is not None and len(carry):
+        yield carry
+
+def flatten_bom_csv(path: Path, station_name: str = None, accumulations: str = "spread",
+                    chunksize: int = 100_000) -> pd.DataFrame:
+    """BoM CSV -> the same frame layout as flatten_station_json (recorded days only)."""
+    parts = [c.loc[c["rainfall_mm"].notna(), COLUMNS]
+             for c in iter_bom_csv(path, chunksize, station_name, accumulations)]
+    parts = [p for p in parts if len(p)]
+    if not parts:
+        return empty_station_frame()
+    df = pd.concat(parts, ignore_index=True)
+    return df.sort_values("date", kind="stable").reset_index(drop=True)
+
+def flatten_station_file(path: Path) -> pd.DataFrame:
+    if Path(path).suffix.lower() == ".csv":
+        return flatten_bom_csv(path)
+    return flatten_station_json(path)
+
+def load_station_file(path: Path) -> dict:
+    """Flatten one file, capturing timing and any parse failure instead of raising."""
+    t0 = time.perf_counter()
+    try:
+        df = flatten_station_file(path)
+        error = None
+    except Exception as exc:  # bad JSON, unreadable file, ...
+        df = empty_station_frame()
+        error = f"{type(exc).__name__}: {exc}"
+    return {
+        "file": Path(path).name,
+        "frame": df,
+        "rows": len(df),
+        "seconds": time.perf_counter() - t0,
+        "error": error,
+    }
+
+def load_all_stations(paths, workers=None, loader=load_station_file):
+    """Flatten many station files, optionally over a process pool.
+
+    Results come back in the order of `paths` regardless of which worker finished
+    first, so the merged frame is deterministic. Returns (frames, report) where
+    frames holds the non-empty station frames and report one dict per file with
+    rows, seconds and error (None on success).
+    """
+    paths = list(paths)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(paths) or 1))
+
+    if workers == 1:
+        results = [loader(p) for p in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(loader, paths))
+
+    frames = [r["frame"] for r in results if r["rows"]]
+    report = [{k: v for k, v in r.items() if k != "frame"} for r in results]
+    return frames, report
+
+def print_load_report(report, per_file=True):
+    for r in report:
+        if r["error"]:
+            print(f"Error: failed to parse {r['file']} ({r['error']})")
+        elif not r["rows"]:
+            print(f"Warning: no rows parsed from {r['file']}")
+        elif per_file:
+            source = " (cache)" if r.get("cached") else ""
+            print(f"  {r['file']}: {r['rows']} rows in {r['seconds']:.3f}s{source}")
+    failed = sum(1 for r in report if r["error"])
+    hits = sum(1 for r in report if r.get("cached"))
+    print(f"Parsed {len(report)} files ({sum(r['rows'] for r in report)} rows, {failed} failed, "
+          f"{hits} from cache) in {sum(r['seconds'] for r in report):.2f}s of worker time")
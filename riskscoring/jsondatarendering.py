@@ -20,11 +20,13 @@ import pandas as pd
 # df_clean["rain_30d"] = df_clean["rainfall_mm"].rolling(30).sum()
 # df_clean.head(20)
 
-#load json 
+#load json (run as `python -m riskscoring.jsondatarendering`)
 import json
 import pandas as pd
 from pathlib import Path
 
+from .panel import StationPanel
+
 # Inputs
 in_path = Path("/Users/chenshihchi1/Downloads/weather data/rain_json_066006_2015_2025 2.json")
 out_csv = Path("rainfall_clean.csv")
@@ -60,10 +62,11 @@ for year, months in years_dict.items():
 #DataFrame + sorting
 df = pd.DataFrame(records).sort_values("date").reset_index(drop=True)
 
-# (Optional) Add rolling features for modeling
+# (Optional) Add rolling features for modeling: calendar days, so gaps in the record don't stretch a window
 if not df.empty:
-    df["rain_7d"] = df["rainfall_mm"].rolling(7, min_periods=1).sum()
-    df["rain_30d"] = df["rainfall_mm"].rolling(30, min_periods=1).sum()
+    panel = StationPanel.from_frame(df, "rainfall_mm")
+    for w, sums in panel.calendar_rolling_sums((7, 30)).items():
+        df[f"rain_{w}d"] = panel.gather(sums)
 
 #Save outputs
 df.to_csv(out_csv, index=False)
@@ -0,0 +1,116 @@
+import hashlib
+import json
+import os
+import pickle
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from .forest import CompiledForest, compile_forest
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Trained drought models saved with what they were trained on, so a run can
+# score with a saved model instead of refitting the forest every time.
+#
+#   model-<fingerprint>.pkl   the fitted classifier
+#   model-<fingerprint>.npz   the same forest as flat node arrays (forest.py), for scikit-learn-free scoring
+#   model-<fingerprint>.json  features, training window, data fingerprint, params
+#   latest.json               metadata of the most recently saved model
+LATEST_FILE = "latest.json"
+RETRAIN_MODES = ("auto", "always", "never")
+
+def data_fingerprint(df: "pd.DataFrame", columns) -> str:
+    """Order-sensitive content hash of the training columns."""
+    import pandas as pd   # only training needs it; loading and scoring a saved model is NumPy-only
+
+    hashed = pd.util.hash_pandas_object(df[list(columns)], index=False)
+    return hashlib.sha1(hashed.to_numpy().tobytes()).hexdigest()[:16]
+
+def model_paths(model_dir: Path, fingerprint: str):
+    model_dir = Path(model_dir)
+    return model_dir / f"model-{fingerprint}.pkl", model_dir / f"model-{fingerprint}.json"
+
+def compiled_path(model_dir: Path, fingerprint: str) -> Path:
+    return Path(model_dir) / f"model-{fingerprint}.npz"
+
+def save_model(model_dir: Path, rf, features, fingerprint: str, train: "pd.DataFrame", forest=None) -> dict:
+    """Persist rf, its compiled form and metadata, and point latest.json at it. Returns the metadata."""
+    model_dir = Path(model_dir)
+    model_dir.mkdir(parents=True, exist_ok=True)
+    pkl_path, meta_path = model_paths(model_dir, fingerprint)
+
+    meta = {
+        "fingerprint": fingerprint,
+        "features": list(features),
+        "train_rows": int(len(train)),
+        "train_start": train["date"].min().strftime("%Y-%m-%d"),
+        "train_end": train["date"].max().strftime("%Y-%m-%d"),
+        "stations": int(train["station_name"].nunique()),
+        "params": {k: v for k, v in rf.get_params().items() if isinstance(v, (int, float, str, bool, type(None)))},
+        "trained_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "model_file": pkl_path.name,
+        "compiled_file": compiled_path(model_dir, fingerprint).name,
+    }
+
+    npz_path = compiled_path(model_dir, fingerprint)
+    tmp = npz_path.with_name(f"{npz_path.stem}.{os.getpid()}.tmp.npz")
+    (forest or compile_forest(rf)).save(tmp)
+    os.replace(tmp, npz_path)
+
+    # temp file + os.replace so a concurrent scorer never sees a half-written model
+    for path, payload, mode in ((pkl_path, pickle.dumps(rf), "wb"),
+                                (meta_path, json.dumps(meta, indent=2), "w"),
+                                (model_dir / LATEST_FILE, json.dumps(meta, indent=2), "w")):
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp, mode) as f:
+            f.write(payload)
+        os.replace(tmp, path)
+    return meta
+
+def load_model(model_dir: Path, fingerprint: str = None, compiled=True):
+    """(model, meta) for the given fingerprint, or for latest.json; None if there is no such model.
+
+    With compiled (the default) the model is the CompiledForest, which loads
+    without scikit-learn; otherwise the pickled classifier.
+    """
+    model_dir = Path(model_dir)
+    meta_path = model_paths(model_dir, fingerprint)[1] if fingerprint else model_dir / LATEST_FILE
+    if not meta_path.exists():
+        return None
+    with open(meta_path) as f:
+        meta = json.load(f)
+    if compiled and "compiled_file" in meta:
+        return CompiledForest.load(model_dir / meta["compiled_file"]), meta
+    with open(model_dir / meta["model_file"], "rb") as f:
+        return pickle.load(f), meta
+
+def model_age_hours(meta: dict) -> float:
+    return (time.time() - time.mktime(time.strptime(meta["trained_at"], "%Y-%m-%dT%H:%M:%S"))) / 3600
+
+def reusable_model(model_dir: Path, fingerprint: str, features, mode="auto", max_age_hours=None, compiled=True):
+    """The saved (forest, meta) a run should score with, or None if it has to train.
+
+    never:  the latest saved model, whatever data it was trained on
+    always: None
+    auto:   the model trained on exactly this data (same fingerprint), unless
+            it is older than max_age_hours
+    A saved model whose feature list differs is never reused. compiled is
+    passed to load_model.
+    """
+    if mode == "always":
+        return None
+    saved = load_model(model_dir, None if mode == "never" else fingerprint, compiled)
+    if saved is None:
+        if mode == "never":
+            raise FileNotFoundError(f"No saved model in {model_dir}; train one first")
+        return None
+    rf, meta = saved
+    if meta["features"] != list(features):
+        if mode == "never":
+            raise ValueError(f"Saved model uses features {meta['features']}, expected {list(features)}")
+        return None
+    if mode == "auto" and max_age_hours is not None and model_age_hours(meta) > max_age_hours:
+        return None
+    return rf, meta
@@ -0,0 +1,183 @@
+import numpy as np
+import pandas as pd
+
+# Stations x days panel. The long frame (one row per station-day, see
+# ingest.COLUMNS) is pivoted once onto a shared daily calendar: values[s, d] is
+# station s on dates[d], mask[s, d] marks days that were observed. Per-station
+# work (rolling sums, quantiles, monthly statistics) then runs along axis 1 for
+# all stations at once instead of through a groupby that re-sorts the frame,
+# and cross-station work (same-day means, neighbour averages) runs along axis 0.
+#
+# rows/cols remember where each frame row landed, so results can be gathered
+# straight back into the frame's row order.
+
+# Calendar rolling windows (days) for rain_<w>d, and the fraction of a window's
+# days that must be observed for its sum to count; below it the sum is NaN.
+ROLLING_WINDOWS = (7, 30, 90, 180, 365)
+ROLLING_MIN_COVERAGE = 0.8
+
+def calendar_rolling_sums(values: np.ndarray, mask: np.ndarray, windows=ROLLING_WINDOWS,
+                          min_coverage=ROLLING_MIN_COVERAGE, scale=False) -> dict:
+    """
+    {w: [stations, days] sums over the w calendar days ending at each day},
+    all from one cumulative sum along the day axis. Missing days add nothing.
+
+    min_coverage: fraction of the w days that must be observed, or a
+                  {window: fraction} dict; windows below it are NaN
+    scale:        rescale each sum by w / observed days, i.e. fill missing days
+                  with the window's mean
+    """
+    observed = mask & ~np.isnan(values)
+    S, D = values.shape
+    csum = np.zeros((S, D + 1))
+    ccount = np.zeros((S, D + 1))
+    np.cumsum(np.where(observed, values, 0.0), axis=1, out=csum[:, 1:])
+    np.cumsum(observed, axis=1, out=ccount[:, 1:])
+
+    end = np.arange(1, D + 1)
+    out = {}
+    for w in windows:
+        start = np.maximum(end - w, 0)
+        n = ccount[:, end] - ccount[:, start]
+        # differences of a running total carry rounding noise; readings are 0.1mm,
+        # so round it away rather than let an all-dry window come out at -1e-13
+        total = np.round(csum[:, end] - csum[:, start], 6)
+        cov = min_coverage.get(w, ROLLING_MIN_COVERAGE) if isinstance(min_coverage, dict) else min_coverage
+        with np.errstate(invalid="ignore", divide="ignore"):
+            if scale:
+                total = total * w / n
+        out[w] = np.where((n > 0) & (n >= cov * w), total, np.nan)
+    return out
+
+class StationPanel:
+    def __init__(self, stations, dates, values, mask, rows=None, cols=None):
+        self.stations = np.asarray(stations, dtype=object)
+        self.dates = np.asarray(dates, dtype="datetime64[D]")
+        self.values = values
+        self.mask = mask
+        self.rows, self.cols = rows, cols
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, value="rainfall_mm", station="station_name"):
+        """Pivot a long frame; a station-day that appears twice keeps its last row."""
+        rows, stations = pd.factorize(df[station], sort=False)   # hashing, no sort of the frame
+        days = df["date"].to_numpy(dtype="datetime64[D]")
+        start = days.min() if len(days) else np.datetime64("1970-01-01")
+        cols = (days - start).astype(np.int64)
+        n_days = int(cols.max()) + 1 if len(cols) else 0
+
+        values = np.full((len(stations), n_days), np.nan)
+        mask = np.zeros((len(stations), n_days), dtype=bool)
+        values[rows, cols] = df[value].to_numpy(dtype=np.float64)
+        mask[rows, cols] = True
+        return cls(stations, start + np.arange(n_days), values, mask, rows, cols)
+
+    @classmethod
+    def from_archive(cls, archive, stations=None):
+        """Panel over a RainArchive (archive.py); the archive's NaN days are the unobserved ones."""
+        idx = range(len(archive)) if stations is None else [archive.station_index(s) for s in stations]
+        values = np.asarray(archive.data[list(idx)], dtype=np.float64)
+        names = [archive.stations[i]["station_name"] for i in idx]
+        return cls(names, archive.dates, values, ~np.isnan(values))
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    def gather(self, arr: np.ndarray) -> np.ndarray:
+        """Per-row values of a panel-shaped array, in the order of the frame this panel came from."""
+        return arr[self.rows, self.cols]
+
+    def to_frame(self, **arrays) -> pd.DataFrame:
+        """Long frame of the observed station-days with one column per panel-shaped array."""
+        s, d = np.nonzero(self.mask)
+        out = pd.DataFrame({"station_name": self.stations[s], "date": self.dates[d].astype("datetime64[ns]")})
+        for name, arr in arrays.items():
+            out[name] = arr[s, d]
+        return out
+
+    # ---- along days (axis 1) ----
+
+    def months(self) -> np.ndarray:
+        """Calendar month (1..12) of each day column."""
+        return self.dates.astype("datetime64[M]").astype(np.int64) % 12 + 1
+
+    def observation_rolling_sum(self, window: int) -> np.ndarray:
+        """
+        Sum over each station's last `window` observations, ending at each
+        observed day; NaN on unobserved days. Matches
+        groupby(station).rolling(window, min_periods=1).sum() on the long frame.
+        """
+        obs = np.nan_to_num(self.values[self.mask])  # row-major: station by station, in date order
+        csum = np.concatenate(([0.0], np.cumsum(obs)))
+        counts = self.mask.sum(axis=1)
+        first = np.repeat(np.cumsum(counts) - counts, counts)  # index of each obs' station's first obs
+        end = np.arange(1, len(obs) + 1)
+        out = np.full(self.shape, np.nan)
+        out[self.mask] = np.round(csum[end] - csum[np.maximum(end - window, first)], 6)
+        return out
+
+    def calendar_rolling_sums(self, windows=ROLLING_WINDOWS, min_coverage=ROLLING_MIN_COVERAGE, scale=False) -> dict:
+        """Gap-aware calendar-day rolling sums for every window; see calendar_rolling_sums."""
+        return calendar_rolling_sums(self.values, self.mask, windows, min_coverage, scale)
+
+    def shift(self, days: int, fill=np.nan) -> np.ndarray:
+        """values shifted forward by `days` calendar days (value from `days` earlier)."""
+        out = np.full(self.shape, fill, dtype=np.float64)
+        if days >= 0:
+            out[:, days:] = self.values[:, :self.shape[1] - days]
+        else:
+            out[:, :days] = self.values[:, -days:]
+        return out
+
+    def quantile(self, arr: np.ndarray, q: float) -> np.ndarray:
+        """Per-station q-quantile of arr over observed days (linear interpolation, as pandas)."""
+        return np.nanquantile(np.where(self.mask, arr, np.nan), q, axis=1)
+
+    def monthly_stats(self, arr: np.ndarray = None):
+        """
+        (count, mean, std) per station and calendar month, each [stations, 12];
+        std uses ddof=1 and is NaN below two observations, as pandas.
+        """
+        arr = self.values if arr is None else arr
+        observed = self.mask & ~np.isnan(arr)
+        onehot = np.eye(12)[self.months() - 1]       # [days, 12]
+        x = np.where(observed, arr, 0.0)
+        count = observed.astype(np.float64) @ onehot
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = (x @ onehot) / count
+            dev = np.where(observed, arr - mean[:, self.months() - 1], 0.0)
+            std = np.sqrt((dev * dev) @ onehot / (count - 1))
+        std[count < 2] = np.nan
+        return count, mean, std
+
+    def monthly_anomaly(self, arr: np.ndarray = None) -> np.ndarray:
+        """z-score of arr against its station's calendar-month mean and std (std 0 -> 1)."""
+        arr = self.values if arr is None else arr
+        _, mean, std = self.monthly_stats(arr)
+        std = np.where(std == 0, 1.0, std)
+        m = self.months() - 1
+        return np.where(self.mask, (arr - mean[:, m]) / std[:, m], np.nan)
+
+    # ---- across stations (axis 0) ----
+
+    def cross_station_mean(self, arr: np.ndarray = None) -> np.ndarray:
+        """Mean over the stations observed on each day."""
+        arr = self.values if arr is None else arr
+        with np.errstate(invalid="ignore"):
+            return np.nanmean(np.where(self.mask, arr, np.nan), axis=0)
+
+    def neighbour_mean(self, neighbours, arr: np.ndarray = None) -> np.ndarray:
+        """
+        Per station and day, the mean of arr over that station's neighbours
+        observed that day. neighbours[s] lists panel row indices, e.g. from
+        StationRegistry.neighbours mapped onto self.stations.
+        """
+        arr = self.values if arr is None else arr
+        S = len(self.stations)
+        weights = np.zeros((S, S))
+        for s, nbrs in enumerate(neighbours):
+            weights[s, list(nbrs)] = 1.0
+        observed = self.mask & ~np.isnan(arr)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return (weights @ np.where(observed, arr, 0.0)) / (weights @ observed)
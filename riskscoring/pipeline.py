@@ -0,0 +1,315 @@
+from functools import cached_property, partial
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+from .archive import RainArchive
+from .cache import load_station_cached, source_key
+from .climatology import Climatology
+from .dag import StageCache, stage_key
+from .export import RISK_COLUMNS, SUMMARY_WINDOWS, risk_columns, stream_risk_outputs
+from .forest import compile_forest
+from .incremental import build_state, run_incremental
+from .indicators import add_indicators, default_indicator_specs
+from .ingest import load_all_stations, load_station_file, print_load_report
+from .models import data_fingerprint, reusable_model, save_model
+from .panel import ROLLING_MIN_COVERAGE, ROLLING_WINDOWS, StationPanel
+
+# The drought-risk pipeline as separate stages. Each stage function takes and
+# returns plain frames, so tools can call just the ones they need; RiskPipeline
+# chains them lazily, computing a stage only when something asks for it.
+#
+#   load -> features -> labels -> (train | saved model) -> predict -> bin -> export
+
+DEFAULT_DATA_DIR = Path(__file__).resolve().parent.parent / "public" / "data"
+FEATURES = ["rain_7d", "rain_30d", "rain_anomaly", "population_2025"]
+RF_PARAMS = dict(n_estimators=300, max_depth=10, random_state=42, class_weight="balanced_subsample", n_jobs=-1)
+
+def required_windows(features=FEATURES) -> set:
+    """Rolling windows (days) the features read as rain_<w>d columns."""
+    return {int(f[len("rain_"):-1]) for f in features
+            if f.startswith("rain_") and f.endswith("d") and f[len("rain_"):-1].isdigit()}
+
+def station_files(data_dir: Path, bom_csv=()) -> list:
+    json_files = sorted(Path(data_dir).glob("*.json"))
+    if not json_files and not bom_csv:
+        raise FileNotFoundError(f"No JSON files found in {data_dir}")
+    return json_files + list(bom_csv)
+
+def load_rainfall(paths, workers=None, cache_dir=None, cache_format="parquet", report=True,
+                  merge_station_numbers=False) -> pd.DataFrame:
+    """Flatten and merge station files into one frame sorted by station and date.
+
+    Set merge_station_numbers when paths include BoM CSVs, which name stations by number only.
+    """
+    loader = load_station_file
+    if cache_dir is not None:
+        loader = partial(load_station_cached, cache_dir=cache_dir, fmt=cache_format)
+
+    all_frames, load_report = load_all_stations(paths, workers=workers, loader=loader)
+    if report:
+        print_load_report(load_report)
+    if not all_frames:
+        raise ValueError("No station rows parsed")
+
+    df = pd.concat(all_frames, ignore_index=True)
+    if merge_station_numbers:
+        # BoM CSVs carry only the station number: borrow the name from a JSON for the
+        # same station, and let the JSON rows win where both cover a day
+        names = (df.loc[df["station_name"] != df["station_num"]]
+                   .drop_duplicates("station_num").set_index("station_num")["station_name"])
+        df["station_name"] = df["station_num"].map(names).fillna(df["station_name"])
+        df = df.drop_duplicates(["station_name", "date"], keep="first")
+    return df.sort_values(["station_name", "date"]).reset_index(drop=True)
+
+def load_rainfall_archive(path: Path) -> pd.DataFrame:
+    """The same frame as load_rainfall, read from a prebuilt rainfall archive (archive.py)."""
+    df = RainArchive(path).to_frame()
+    if df.empty:
+        raise ValueError("No station rows parsed")
+    return df.sort_values(["station_name", "date"]).reset_index(drop=True)
+
+def merge_population(df: pd.DataFrame, pop_csv: Path) -> pd.DataFrame:
+    pop = pd.read_csv(pop_csv)
+    pop["station_name"] = pop["station_name"].astype(str).str.strip()
+    df = df.assign(station_name=df["station_name"].astype(str).str.strip())
+
+    df = df.merge(pop.rename(columns={"population": "population_2025"}),
+                  on="station_name", how="left")
+    if df["population_2025"].isna().any():
+        df["population_2025"] = df["population_2025"].fillna(df["population_2025"].median())
+    return df
+
+def add_labels(df: pd.DataFrame, quantile=0.20) -> pd.DataFrame:
+    """Station-specific drought label: rain_30d in the station's lowest `quantile`."""
+    df = df.copy()
+    panel = StationPanel.from_frame(df, "rain_30d")
+    q = panel.quantile(panel.values, quantile)[panel.rows]
+    df["drought_label"] = (df["rain_30d"].to_numpy() < q).astype(int)
+    return df
+
+def add_anomaly(df: pd.DataFrame, climatology: Climatology = None) -> pd.DataFrame:
+    """Monthly z-score of rainfall within station, against `climatology` or one built from df."""
+    df = df.copy()
+    climatology = climatology or Climatology.from_frame(df)
+    df["rain_anomaly"] = climatology.anomaly(df["station_name"], df["date"], df["rainfall_mm"])
+    return df
+
+def model_frame(df: pd.DataFrame, features=FEATURES) -> pd.DataFrame:
+    """
+    Rows with every feature and a label. Rolling sums below min_coverage are
+    NaN (see panel.calendar_rolling_sums), so gappy station-days are dropped
+    here; how many, and for which columns, is printed.
+    """
+    missing = df[list(features) + ["drought_label"]].isna()
+    keep = ~missing.any(axis=1).to_numpy()
+    dropped = len(df) - int(keep.sum())
+    if dropped:
+        by_column = ", ".join(f"{c} {n:,}" for c, n in missing.sum().items() if n)
+        print(f"model frame: dropped {dropped:,} of {len(df):,} rows with missing values ({by_column})")
+    return df[keep].copy()
+
+def train_forest(model_df: pd.DataFrame, features=FEATURES, train_fraction=0.8, **rf_params):
+    """Fit the forest on the first train_fraction of rows. Returns (rf, train rows)."""
+    from sklearn.ensemble import RandomForestClassifier
+
+    # simple time-ordered split across all stations
+    split_idx = int(len(model_df) * train_fraction)
+    train = model_df.iloc[:split_idx]
+    rf = RandomForestClassifier(**{**RF_PARAMS, **rf_params})
+    rf.fit(train[list(features)], train["drought_label"])
+    return rf, train
+
+def fit_or_load_model(model_df: pd.DataFrame, model_dir: Path, features=FEATURES,
+                      retrain="auto", max_age_hours=None):
+    """(rf, meta) to score with: a reusable saved model (see models.reusable_model) or a fresh fit."""
+    fingerprint = data_fingerprint(model_df, ["station_name", "date"] + list(features) + ["drought_label"])
+    saved = reusable_model(model_dir, fingerprint, features, retrain, max_age_hours, compiled=False)
+    if saved is not None:
+        print(f"Scoring with saved model {saved[1]['fingerprint']} "
+              f"(trained {saved[1]['trained_at']} on {saved[1]['train_start']}..{saved[1]['train_end']})")
+        return saved
+
+    rf, train = train_forest(model_df, features)
+    meta = save_model(model_dir, rf, features, fingerprint, train)
+    print(f"Saved model {meta['fingerprint']} → {model_dir}")
+    return rf, meta
+
+def predict_risk(model_df: pd.DataFrame, rf, features=FEATURES) -> pd.DataFrame:
+    model_df = model_df.copy()
+    # scikit-learn's own traversal: on a full run's rows it is several times faster
+    # than the compiled forest, which only wins on incremental batches (bench_forest.py)
+    model_df["risk_prob"] = rf.predict_proba(model_df[list(features)])[:, 1]
+    return model_df
+
+def bin_risk(scored: pd.DataFrame, n_classes=5) -> pd.DataFrame:
+    """1..n_classes risk classes via percentile rank, plus the population-weighted impact score."""
+    scored = scored.copy()
+    # robust classes via percentile rank (avoids qcut duplicate-edge errors)
+    q = scored["risk_prob"].rank(pct=True, method="average")
+    scored["risk_class"] = np.ceil(q * n_classes).astype(int).clip(1, n_classes)
+
+    # impact score = hazard × exposure (population normalised 0–1)
+    pop_min, pop_ptp = population_scale(scored)
+    scored["pop_norm_01"] = (scored["population_2025"] - pop_min) / pop_ptp
+    scored["impact_score"] = scored["risk_prob"] * scored["pop_norm_01"]
+    return scored
+
+def population_scale(df: pd.DataFrame):
+    pop_min = df["population_2025"].min()
+    return pop_min, max(df["population_2025"].max() - pop_min, 1.0)
+
+def export_risk(binned: pd.DataFrame, out_dir: Path, fmt="records", windows=SUMMARY_WINDOWS,
+                columns=RISK_COLUMNS) -> Path:
+    """Combined NDJSON and per-station files in one streaming pass; returns the combined path."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    combined_out = out_dir / "all_stations_risk_with_population.ndjson"
+    n_stations = stream_risk_outputs(binned.sort_values(["station_name", "date"]), out_dir, combined_out,
+                                     fmt, windows, columns=columns)
+    print(f"Saved combined results → {combined_out}")
+    print(f"Saved {n_stations} per-station outputs to {out_dir}")
+    return combined_out
+
+class RiskPipeline:
+    """Lazily evaluated pipeline: each property runs its stage (and what it needs) on first access.
+
+        p = RiskPipeline(data_dir="public/data")
+        p.features          # loads and builds features only
+        p.binned            # ... through training/prediction and binning
+        p.export()          # writes *_risk.json and the combined NDJSON
+
+    With stage_cache_dir every stage output is also memoised on disk under its
+    content key (see dag.py), so a rerun recomputes only the stages downstream
+    of what changed, e.g. only binning and export after changing n_classes.
+    """
+
+    def __init__(self, data_dir: Path = DEFAULT_DATA_DIR, pop_csv: Path = None, out_dir: Path = None,
+                 bom_csv=(), workers=None, cache_dir=None, cache_format="parquet",
+                 model_dir: Path = None, state_dir: Path = None, retrain="auto", max_model_age=None,
+                 label_quantile=0.20, n_classes=5, risk_format="records", summary_windows=SUMMARY_WINDOWS,
+                 stage_cache_dir: Path = None, archive: Path = None,
+                 rolling_windows=ROLLING_WINDOWS, min_coverage=ROLLING_MIN_COVERAGE, indicator_specs=None,
+                 export_indicators=False):
+        self.data_dir = Path(data_dir)
+        self.pop_csv = Path(pop_csv) if pop_csv else self.data_dir / "population.csv"
+        self.out_dir = Path(out_dir) if out_dir else self.data_dir / "out"
+        self.model_dir = Path(model_dir) if model_dir else self.out_dir / "models"
+        self.state_dir = Path(state_dir) if state_dir else self.out_dir / "state"
+        self.bom_csv = list(bom_csv)
+        self.archive = Path(archive) if archive else None
+        self.workers, self.cache_dir, self.cache_format = workers, cache_dir, cache_format
+        self.retrain, self.max_model_age = retrain, max_model_age
+        self.label_quantile, self.n_classes = label_quantile, n_classes
+        self.risk_format, self.summary_windows = risk_format, summary_windows
+        self.export_columns = risk_columns(export_indicators)
+        self.rolling_windows, self.min_coverage = tuple(rolling_windows), min_coverage
+        missing = required_windows() - set(self.rolling_windows)
+        if missing:
+            raise ValueError(f"rolling_windows must include {sorted(missing)}: FEATURES reads those rain_<w>d columns")
+        self.indicator_specs = indicator_specs or default_indicator_specs(self.rolling_windows)
+        self.stages = StageCache(stage_cache_dir) if stage_cache_dir else None
+        self._keys = {}
+
+    # stage -> (upstream stages, parameters that change its output)
+    def stage_spec(self, name):
+        if name == "rainfall" and self.archive:
+            return (), {"archive": source_key(self.archive)}
+        if name == "model":
+            # the model actually resolved from model_dir, so a new latest.json or a refit
+            # after max_model_age changes every key downstream of it
+            return (), {key: self.model_meta[key] for key in ("fingerprint", "trained_at", "params")}
+        return {
+            "rainfall": ((), {"sources": [source_key(p) for p in station_files(self.data_dir, self.bom_csv)],
+                              "merge_station_numbers": bool(self.bom_csv)}),
+            "features": (("rainfall",), {"pop_csv": source_key(self.pop_csv), "indicators": self.indicator_specs,
+                                         "min_coverage": self.min_coverage}),
+            "labelled": (("features",), {"label_quantile": self.label_quantile}),
+            "model_df": (("labelled",), {"features": FEATURES}),
+            "scored": (("model_df", "model"), {}),
+            "binned": (("scored",), {"n_classes": self.n_classes}),
+        }[name]
+
+    def stage_key(self, name) -> str:
+        """Content key of a stage: its parameters plus the keys of everything upstream."""
+        if name not in self._keys:
+            upstream, params = self.stage_spec(name)
+            self._keys[name] = stage_key(name, params, [self.stage_key(u) for u in upstream])
+        return self._keys[name]
+
+    def _stage(self, name, compute):
+        # the model is never memoised here: model_dir already caches fits, and which
+        # saved model applies (retrain mode, latest.json, max_model_age) is decided each run
+        if self.stages is None or name == "model":
+            return compute()
+        return self.stages.get_or_compute(name, self.stage_key(name), compute)
+
+    @cached_property
+    def rainfall(self) -> pd.DataFrame:
+        if self.archive:
+            return self._stage("rainfall", lambda: load_rainfall_archive(self.archive))
+        return self._stage("rainfall", lambda: load_rainfall(
+            station_files(self.data_dir, self.bom_csv), self.workers, self.cache_dir, self.cache_format,
+            merge_station_numbers=bool(self.bom_csv)))
+
+    @cached_property
+    def features(self) -> pd.DataFrame:
+        # rain_<w>d plus the other drought indicators (indicators.py), all from one panel
+        return self._stage("features", lambda: merge_population(
+            add_indicators(self.rainfall, self.indicator_specs, self.min_coverage), self.pop_csv))
+
+    @cached_property
+    def climatology(self) -> Climatology:
+        # built once per run, for rain_anomaly and for the incremental state
+        return Climatology.from_frame(self.features)
+
+    @cached_property
+    def labelled(self) -> pd.DataFrame:
+        return self._stage("labelled", lambda: add_anomaly(add_labels(self.features, self.label_quantile),
+                                                           self.climatology))
+
+    @cached_property
+    def model_df(self) -> pd.DataFrame:
+        return self._stage("model_df", lambda: model_frame(self.labelled))
+
+    @cached_property
+    def _resolved_model(self):
+        return self._stage("model", lambda: fit_or_load_model(
+            self.model_df, self.model_dir, FEATURES, self.retrain, self.max_model_age))
+
+    @property
+    def model(self):
+        return self._resolved_model[0]
+
+    @property
+    def model_meta(self) -> dict:
+        """Metadata of the saved model this run scores with (see models.save_model)."""
+        return self._resolved_model[1]
+
+    @cached_property
+    def scored(self) -> pd.DataFrame:
+        return self._stage("scored", lambda: predict_risk(self.model_df, self.model))
+
+    @cached_property
+    def binned(self) -> pd.DataFrame:
+        return self._stage("binned", lambda: bin_risk(self.scored, self.n_classes))
+
+    def export(self) -> Path:
+        return export_risk(self.binned, self.out_dir, self.risk_format, self.summary_windows, self.export_columns)
+
+    def save_state(self):
+        """State for later incremental runs."""
+        pop_min, pop_ptp = population_scale(self.binned)
+        # incremental runs score a few rows per station, where the compiled forest is fastest
+        build_state(self.labelled, compile_forest(self.model), FEATURES, self.binned["risk_prob"], pop_min, pop_ptp,
+                    self.state_dir, self.rolling_windows, self.min_coverage, self.climatology, self.indicator_specs)
+        print(f"Saved scoring state → {self.state_dir}")
+
+    def run(self):
+        """The full run: export the binned scores and save incremental state."""
+        self.export()
+        self.save_state()
+
+    def run_incremental(self) -> int:
+        return run_incremental(self.rainfall, self.state_dir, self.out_dir, self.summary_windows, self.risk_format,
+                               self.export_columns)
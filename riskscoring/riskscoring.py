@@ -1,183 +1,100 @@
-import json
+import argparse
+import os
+import sys
 from pathlib import Path
-import numpy as np
-import pandas as pd
-from sklearn.ensemble import RandomForestClassifier
 
-# --------- CONFIG ---------
-DATA_DIR = Path("/Users/chenshihchi1/Desktop/SYNCS-HACK-2025/public/data")  # folder with raw station JSONs
-POP_CSV  = DATA_DIR / "population.csv"                                       # station_name,population
-OUT_DIR  = DATA_DIR / "out"
-OUT_DIR.mkdir(parents=True, exist_ok=True)
-
-# --------- HELPERS ---------
-MONTH_FIX = {
-    # handle common variants; pandas uses %B for English month names
-    "jan": "January", "january": "January",
-    "feb": "February", "february": "February",
-    "mar": "March", "march": "March",
-    "apr": "April", "april": "April",
-    "may": "May",
-    "jun": "June", "june": "June",
-    "jul": "July", "july": "July",
-    "aug": "August", "august": "August",
-    "sep": "September", "sept": "September", "september": "September",
-    "oct": "October", "october": "October",
-    "nov": "November", "november": "November",
-    "dec": "December", "december": "December",
-}
-
-def norm_month_name(name: str) -> str:
-    if not isinstance(name, str):
-        name = str(name)
-    key = name.strip().lower()
-    return MONTH_FIX.get(key, name.strip())
-
-def flatten_station_json(path: Path) -> pd.DataFrame:
-    """Flatten ONE raw station JSON (nested years->MonthName->day) to rows."""
-    with open(path, "r") as f:
-        data = json.load(f)
-
-    station_num  = str(data.get("stationNum", "")).strip()
-    station_name = str(data.get("stationName", "")).strip()
-    years = data.get("years", {})
-
-    rows = []
-    for year, months in years.items():
-        for month_name_raw, days in months.items():
-            month_name = norm_month_name(month_name_raw)
-            for day_str, rainfall in (days or {}).items():
-                # build date safely
-                try:
-                    day_int = int(day_str)
-                except Exception:
-                    continue
-                # allow floats/ints/strings for rainfall
-                try:
-                    rain_val = float(rainfall)
-                except Exception:
-                    continue
-
-                # Parse "YYYY-MonthName-DD" with %B
-                date = pd.to_datetime(f"{year}-{month_name}-{day_int}",
-                                      format="%Y-%B-%d", errors="coerce")
-                if pd.isna(date):
-                    continue
-
-                rows.append({
-                    "station_num": station_num,
-                    "station_name": station_name,
-                    "date": date,
-                    "rainfall_mm": rain_val,
-                })
-
-    if not rows:
-        return pd.DataFrame(columns=["station_num","station_name","date","rainfall_mm"])
-
-    df = pd.DataFrame(rows).sort_values("date").reset_index(drop=True)
-    return df
-
-# --------- LOAD & FLATTEN ALL -------
-all_frames = []
-json_files = sorted([p for p in DATA_DIR.glob("*.json") if p.name != POP_CSV.name])
-if not json_files:
-    raise FileNotFoundError(f"No JSON files found in {DATA_DIR}")
-
-for fp in json_files:
-    df_i = flatten_station_json(fp)
-    if df_i.empty:
-        print(f"Warning: no rows parsed from {fp.name}")
-        continue
-    all_frames.append(df_i)
-
-df = pd.concat(all_frames, ignore_index=True)
-df = df.sort_values(["station_name", "date"]).reset_index(drop=True)
-
-# --------- ROLLING FEATURES (per station) --------
-df["rain_7d"] = (
-    df.groupby("station_name")["rainfall_mm"]
-      .rolling(7, min_periods=1).sum().reset_index(level=0, drop=True)
-)
-df["rain_30d"] = (
-    df.groupby("station_name")["rainfall_mm"]
-      .rolling(30, min_periods=1).sum().reset_index(level=0, drop=True)
-)
-
-# --------- POPULATION MERGE -------
-pop = pd.read_csv(POP_CSV)
-pop["station_name"] = pop["station_name"].astype(str).str.strip()
-df["station_name"] = df["station_name"].astype(str).str.strip()
-
-df = df.merge(pop.rename(columns={"population":"population_2025"}),
-              on="station_name", how="left")
-if df["population_2025"].isna().any():
-    df["population_2025"] = df["population_2025"].fillna(df["population_2025"].median())
-
-# --------- LABELS: station-specific (lowest 20% of rain_30d within station) -------
-q20 = df.groupby("station_name")["rain_30d"].transform(lambda s: s.quantile(0.20))
-df["drought_label"] = (df["rain_30d"] < q20).astype(int)
-
-# ------- ANOMALY: monthly z-score within station ---------
-month_idx = df["date"].dt.month
-grp = df.groupby(["station_name", month_idx])
-monthly_mean = grp["rainfall_mm"].transform("mean")
-monthly_std  = grp["rainfall_mm"].transform("std").replace(0, 1.0)
-df["rain_anomaly"] = (df["rainfall_mm"] - monthly_mean) / monthly_std
-
-# ----- MODEL ---------
-features = ["rain_7d", "rain_30d", "rain_anomaly", "population_2025"]
-model_df = df.dropna(subset=features + ["drought_label"]).copy()
-
-X = model_df[features]
-y = model_df["drought_label"]
-
-# simple time-ordered split across all stations
-split_idx = int(len(model_df) * 0.8)
-X_train, X_test = X.iloc[:split_idx], X.iloc[split_idx:]
-y_train, y_test = y.iloc[:split_idx], y.iloc[split_idx:]
-
-rf = RandomForestClassifier(
-    n_estimators=300,
-    max_depth=10,
-    random_state=42,
-    class_weight="balanced_subsample",
-    n_jobs=-1
-)
-rf.fit(X_train, y_train)
-
-# --------- PREDICT + BIN (robust) ---------
-model_df["risk_prob"] = rf.predict_proba(model_df[features])[:, 1]
-
-# robust 1..5 classes via percentile rank (avoids qcut duplicate-edge errors)
-q = model_df["risk_prob"].rank(pct=True, method="average")
-model_df["risk_class"] = np.ceil(q * 5).astype(int)
-model_df.loc[model_df["risk_class"] < 1, "risk_class"] = 1
-model_df.loc[model_df["risk_class"] > 5, "risk_class"] = 5
-
-# impact score = hazard × exposure (population normalised 0–1)
-pop_min = model_df["population_2025"].min()
-pop_ptp = max(model_df["population_2025"].max() - pop_min, 1.0)
-model_df["pop_norm_01"] = (model_df["population_2025"] - pop_min) / pop_ptp
-model_df["impact_score"] = model_df["risk_prob"] * model_df["pop_norm_01"]
-
-# --------- SAVE ---------
-combined = model_df.sort_values(["station_name", "date"])
-
-# Keep only the desired columns
-keep_cols = ["station_name", "date", "population_2025", "rainfall_mm", "risk_class"]
-combined_out_df = combined[keep_cols]
-
-# Save combined file as JSON
-combined_out = OUT_DIR / "all_stations_risk_with_population.json"
-combined_out_df.to_json(combined_out, orient="records", date_format="iso")
-print(f"Saved combined results → {combined_out}")
-
-# Save per-station JSON files
-for stn, g in combined_out_df.groupby("station_name", sort=True):
-    safe = "".join(c for c in stn if c.isalnum() or c in (" ","_","-")).strip().replace(" ", "_")
-    out_path = OUT_DIR / f"{safe}_risk.json"
-    g.to_json(out_path, orient="records", date_format="iso")
-print(f"Saved per-station JSONs to {OUT_DIR}")
-
-
-#station_name, date, population, rainfall_mm, risk class 
\ No newline at end of file
+if not __package__:
+    # run as a script: put the package's parent on the path in place of this
+    # directory (where "riskscoring" would resolve to this file), then import as
+    # part of the package; the relative imports below load the package itself
+    sys.path[0] = str(Path(__file__).resolve().parent.parent)
+    __package__ = "riskscoring"
+
+from .cache import CACHE_FORMATS
+from .dag import print_stage_report
+from .export import RISK_FORMATS, SUMMARY_WINDOWS
+from .models import RETRAIN_MODES
+from .panel import ROLLING_MIN_COVERAGE, ROLLING_WINDOWS
+from .pipeline import DEFAULT_DATA_DIR, RiskPipeline, required_windows
+
+# Command-line entry point; the stages themselves live in pipeline.py and can be
+# imported without running anything.
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(prog="riskscoring", description="Station drought risk scoring")
+    ap.add_argument("--data-dir", type=Path, default=DEFAULT_DATA_DIR,
+                    help="folder with the raw station JSONs (default: %(default)s)")
+    ap.add_argument("--pop-csv", type=Path, default=None,
+                    help="station_name,population CSV (default: DATA_DIR/population.csv)")
+    ap.add_argument("--out-dir", type=Path, default=None,
+                    help="where *_risk.json and the combined output go (default: DATA_DIR/out)")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                    help="processes used to flatten station JSONs (1 = serial)")
+    ap.add_argument("--cache-dir", type=Path, default=None,
+                    help="cache flattened station frames here; reused until the source JSON changes")
+    ap.add_argument("--cache-format", choices=sorted(CACHE_FORMATS), default="parquet")
+    ap.add_argument("--bom-csv", type=Path, nargs="+", default=[],
+                    help="extra BoM daily rainfall CSVs (IDCJAC0009), streamed in chunks")
+    ap.add_argument("--archive", type=Path, default=None,
+                    help="read rainfall from this prebuilt archive (archive.py) instead of the station files")
+    ap.add_argument("--incremental", action="store_true",
+                    help="score only days newer than the saved state and append them to *_risk.json")
+    ap.add_argument("--state-dir", type=Path, default=None,
+                    help="incremental scoring state (default: OUT_DIR/state)")
+    ap.add_argument("--summary-windows", type=int, nargs="+", default=list(SUMMARY_WINDOWS),
+                    help="trailing windows (rows) averaged into each *_risk.summary.json sidecar")
+    ap.add_argument("--risk-format", choices=RISK_FORMATS, default="records",
+                    help="per-station output: *_risk.json records, compact *_risk.cols.json, or both")
+    ap.add_argument("--export-indicators", action="store_true",
+                    help="also write the drought indicators (days_since_rain, deficit_<w>d, ...) to the "
+                         "per-station and combined outputs; pass it to --incremental runs too")
+    ap.add_argument("--model-dir", type=Path, default=None,
+                    help="saved drought models (default: OUT_DIR/models)")
+    ap.add_argument("--retrain", choices=RETRAIN_MODES, default="auto",
+                    help="auto: reuse the model saved for identical training data; always: refit; "
+                         "never: score with the latest saved model")
+    ap.add_argument("--score-only", action="store_true",
+                    help="inference only: load the latest saved model and score (same as --retrain never)")
+    ap.add_argument("--max-model-age", type=float, default=None, metavar="HOURS",
+                    help="with --retrain auto, refit once the matching saved model is older than this")
+    ap.add_argument("--stage-cache", type=Path, default=None,
+                    help="memoise each pipeline stage here, keyed on its inputs and parameters")
+    ap.add_argument("--label-quantile", type=float, default=0.20,
+                    help="rain_30d quantile below which a day is labelled drought")
+    ap.add_argument("--risk-classes", type=int, default=5, help="number of risk_class bins")
+    ap.add_argument("--rolling-windows", type=int, nargs="+", default=list(ROLLING_WINDOWS),
+                    help="calendar-day windows summed into rain_<w>d columns (must include 7 and 30)")
+    ap.add_argument("--min-coverage", type=float, default=ROLLING_MIN_COVERAGE,
+                    help="fraction of a window's days that must be observed, else rain_<w>d is NaN")
+    args = ap.parse_args(argv)
+    missing = required_windows() - set(args.rolling_windows)
+    if missing:
+        ap.error(f"--rolling-windows must include {' and '.join(map(str, sorted(missing)))} (used as model features)")
+    return args
+
+def pipeline_from_args(args) -> RiskPipeline:
+    return RiskPipeline(
+        data_dir=args.data_dir, pop_csv=args.pop_csv, out_dir=args.out_dir, bom_csv=args.bom_csv,
+        workers=args.workers, cache_dir=args.cache_dir, cache_format=args.cache_format,
+        model_dir=args.model_dir, state_dir=args.state_dir,
+        retrain="never" if args.score_only else args.retrain, max_model_age=args.max_model_age,
+        risk_format=args.risk_format, summary_windows=args.summary_windows,
+        export_indicators=args.export_indicators,
+        label_quantile=args.label_quantile, n_classes=args.risk_classes, stage_cache_dir=args.stage_cache,
+        archive=args.archive, rolling_windows=args.rolling_windows, min_coverage=args.min_coverage,
+    )
+
+def main(argv=None):
+    args = parse_args(argv)
+    pipeline = pipeline_from_args(args)
+    pipeline.out_dir.mkdir(parents=True, exist_ok=True)
+
+    if args.incremental:
+        pipeline.run_incremental()
+    else:
+        pipeline.run()
+    if pipeline.stages is not None:
+        print_stage_report(pipeline.stages.report)
+
+if __name__ == "__main__":
+    main()
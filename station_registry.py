@@ -0,0 +1,128 @@
+"""
+Station coordinates held once as NumPy arrays, with cached bounds, batch
+coordinate-to-grid transforms and a cKDTree for nearest-station and radius
+queries, so gridding, labelling and neighbour lookups share one copy instead
+of each looping over the station dict.
+"""
+import json
+from functools import cached_property, lru_cache
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+STATION_COORDINATES = "public/data/station_coordinates.json"
+
+# Grid cells per degree, as used by redistribution
+CELLS_PER_DEGREE = 300
+
+# Equirectangular km per degree; plenty for station-to-station distances
+KM_PER_DEGREE_LAT = 110.574
+KM_PER_DEGREE_LON = 111.320
+
+
+class StationRegistry:
+    def __init__(self, names, latitudes, longitudes):
+        self.names = list(names)
+        self.latitudes = np.asarray(latitudes, dtype=np.float64)
+        self.longitudes = np.asarray(longitudes, dtype=np.float64)
+        self._index = {name: i for i, name in enumerate(self.names)}
+
+    @classmethod
+    def from_stations(cls, stations):
+        """From a {name: {'latitude', 'longitude', ...}} dict such as extracting_jsons.start() returns."""
+        names = list(stations)
+        return cls(names,
+                   [stations[name]['latitude'] for name in names],
+                   [stations[name]['longitude'] for name in names])
+
+    @classmethod
+    def from_json(cls, path=STATION_COORDINATES):
+        with open(path, "r") as f:
+            return cls.from_stations(json.load(f))
+
+    @classmethod
+    def of(cls, stations):
+        """
+        stations itself if it is already a registry, otherwise the registry for
+        the dict's (name, latitude, longitude) set, built once and then reused
+        with its bounds and tree, so repeated calls on the same stations are cheap.
+        """
+        if isinstance(stations, cls):
+            return stations
+        return _registry_for(cls, tuple((name, float(v['latitude']), float(v['longitude']))
+                                        for name, v in stations.items()))
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self._index
+
+    def index_of(self, name):
+        return self._index[name]
+
+    @cached_property
+    def bounds(self):
+        """(min_lat, max_lat, min_lon, max_lon) of the raw coordinates."""
+        return (self.latitudes.min(), self.latitudes.max(),
+                self.longitudes.min(), self.longitudes.max())
+
+    def grid_indices(self, left_buffer, top_buffer):
+        """
+        redistribution.coord_to_index for every station at once: returns
+        (rows, cols) with rows from longitude and cols from latitude, the
+        (j, i) order the grid is indexed in. Indices may be negative or out
+        of range; callers decide how to treat those.
+        """
+        _, max_lat, min_lon, _ = self.bounds
+        cols = (self._cells(self.latitudes) - int(abs(max_lat) * CELLS_PER_DEGREE) + top_buffer)
+        rows = (self._cells(self.longitudes) - int(abs(min_lon) * CELLS_PER_DEGREE) + left_buffer)
+        return rows, cols
+
+    @staticmethod
+    def _cells(coords):
+        # int() truncation of abs(coord) * 300, as in coord_to_index
+        return np.trunc(np.abs(coords) * CELLS_PER_DEGREE).astype(np.intp)
+
+    def _project(self, latitudes, longitudes):
+        """Degrees to approximate km on a plane through the stations' mean latitude."""
+        scale = KM_PER_DEGREE_LON * np.cos(np.radians(self.latitudes.mean()))
+        return np.column_stack([np.asarray(latitudes, dtype=np.float64) * KM_PER_DEGREE_LAT,
+                                np.asarray(longitudes, dtype=np.float64) * scale])
+
+    @cached_property
+    def tree(self):
+        return cKDTree(self._project(self.latitudes, self.longitudes))
+
+    def nearest(self, latitude, longitude, k=1):
+        """
+        The k stations nearest to a point (or to each of an array of points):
+        (distances_km, indices), shaped like cKDTree.query. Use names[i] for the station.
+        """
+        points = self._project(np.atleast_1d(latitude), np.atleast_1d(longitude))
+        dist, idx = self.tree.query(points, k=min(k, len(self)))
+        if np.ndim(latitude) == 0:
+            return dist[0], idx[0]
+        return dist, idx
+
+    def within(self, latitude, longitude, radius_km):
+        """Indices of the stations within radius_km of a point, nearest first."""
+        point = self._project([latitude], [longitude])[0]
+        idx = np.asarray(self.tree.query_ball_point(point, radius_km), dtype=np.intp)
+        dist = np.hypot(*(self.tree.data[idx] - point).T)
+        return idx[np.argsort(dist, kind='stable')]
+
+    def neighbours(self, radius_km):
+        """For every station, the indices of the other stations within radius_km."""
+        pairs = self.tree.query_pairs(radius_km, output_type='ndarray')
+        result = [[] for _ in range(len(self))]
+        for a, b in pairs:
+            result[a].append(b)
+            result[b].append(a)
+        return [np.array(sorted(n), dtype=np.intp) for n in result]
+
+
+@lru_cache(maxsize=32)
+def _registry_for(cls, key):
+    names, latitudes, longitudes = zip(*key) if key else ((), (), ())
+    return cls(names, latitudes, longitudes)
@@ -0,0 +1,217 @@
+"""
+Risk surfaces as a precomputed linear operator of the station values.
+
+The idw and nearest engines in redistribution weight each seed purely by
+where it sits, so for a fixed station layout the surface is
+operator @ station_values with a sparse (cells x stations) operator. It is
+built once, cached to disk keyed on the layout, and every further surface
+(one per day of *_risk.json history) is a sparse mat-vec plus the 1..5 rescale.
+
+    python surface_operator.py OUT_DIR [--engine idw|nearest] [--cache-dir DIR] [--workers N]
+
+The diffusion engine is not linear (a cell only moves while it is below its
+local maximum, which depends on the values), so it has no exact operator
+and is not offered here.
+"""
+import argparse
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.ndimage import distance_transform_edt
+from scipy.spatial import cKDTree
+
+import redistribution as rd
+from extracting_jsons import risk_history
+
+OPERATOR_ENGINES = ("idw", "nearest")
+# part of operator_key: bump when the operator layout changes so cached files are rebuilt
+OPERATOR_VERSION = 2
+
+
+def idw_operator(shape, rows, cols, power=2, k=8, max_distance=200, chunk_rows=256):
+    """Sparse operator reproducing redistribution.idw_surface for seeds at (rows, cols)."""
+    # idw_surface builds its tree from the seeds in row-major cell order; among
+    # equidistant k-th nearest seeds the tree's pick depends on that order, so
+    # build it the same way and map tree indices back to operator columns
+    order = np.lexsort((cols, rows))
+    seeds = np.column_stack([rows, cols])[order]
+    tree = cKDTree(seeds)
+    k = min(k, len(seeds))
+    n_rows, n_cols = shape
+    grid_cols = np.arange(n_cols)
+    upper = np.inf if max_distance is None else max_distance
+
+    cell_ids, seed_ids, weights = [], [], []
+    for start in range(0, n_rows, chunk_rows):
+        stop = min(start + chunk_rows, n_rows)
+        rr, cc = np.meshgrid(np.arange(start, stop), grid_cols, indexing='ij')
+        dist, idx = tree.query(np.column_stack([rr.ravel(), cc.ravel()]), k=k, distance_upper_bound=upper)
+        dist = dist.reshape(-1, k)
+        idx = idx.reshape(-1, k)
+
+        found = np.isfinite(dist)
+        with np.errstate(divide='ignore'):
+            w = np.where(found, 1.0 / dist ** power, 0.0)
+        exact = found & (dist == 0)
+        w = np.where(exact.any(axis=1, keepdims=True), exact.astype(np.float64), w)
+
+        total = w.sum(axis=1, keepdims=True)
+        w = np.divide(w, total, out=np.zeros_like(w), where=total > 0)
+
+        keep = w > 0
+        cells = start * n_cols + np.arange((stop - start) * n_cols)
+        cell_ids.append(np.broadcast_to(cells[:, None], w.shape)[keep])
+        seed_ids.append(order[idx[keep]])
+        weights.append(w[keep])
+
+    return sparse.csr_matrix(
+        (np.concatenate(weights), (np.concatenate(cell_ids), np.concatenate(seed_ids))),
+        shape=(n_rows * n_cols, len(seeds)))
+
+
+def nearest_operator(shape, rows, cols, decay=1.0, max_distance=200):
+    """Sparse operator reproducing redistribution.nearest_surface: one entry per reached cell."""
+    mask = np.zeros(shape, dtype=bool)
+    mask[rows, cols] = True
+    seed_index = np.full(shape, -1, dtype=np.intp)
+    seed_index[rows, cols] = np.arange(len(rows))
+
+    dist, (inds_r, inds_c) = distance_transform_edt(~mask, return_indices=True)
+    w = np.ones(shape, dtype=np.float64) if decay == 1.0 else decay ** dist
+    if max_distance is not None:
+        w[dist > max_distance] = 0
+
+    keep = (w > 0).ravel()
+    cells = np.flatnonzero(keep)
+    seeds = seed_index[inds_r, inds_c].ravel()[keep]
+    return sparse.csr_matrix((w.ravel()[keep], (cells, seeds)),
+                             shape=(shape[0] * shape[1], len(rows)))
+
+
+def build_operator(shape, rows, cols, engine="idw", **engine_kwargs):
+    if engine == "idw":
+        return idw_operator(shape, rows, cols, **engine_kwargs)
+    if engine == "nearest":
+        return nearest_operator(shape, rows, cols, **engine_kwargs)
+    raise ValueError(f"engine {engine!r} has no linear operator; use one of {OPERATOR_ENGINES}")
+
+
+def operator_key(shape, rows, cols, engine, engine_kwargs):
+    """Hash of everything the operator depends on: grid, seed cells, engine and its settings."""
+    h = hashlib.sha1()
+    h.update(json.dumps([OPERATOR_VERSION, list(shape), engine, sorted(engine_kwargs.items())]).encode())
+    h.update(np.asarray(rows, dtype=np.int64).tobytes())
+    h.update(np.asarray(cols, dtype=np.int64).tobytes())
+    return h.hexdigest()[:16]
+
+
+def station_operator(json_data, N, M, left_buffer, top_buffer, engine="idw", cache_dir=None, **engine_kwargs):
+    """
+    (names, operator) for a station layout: column j of the operator belongs
+    to station names[j]. With cache_dir the operator is loaded from, or saved
+    to, an .npz named after operator_key, so a moved station or a different
+    grid or engine setting builds a new one.
+    """
+    names, rows, cols = rd.station_cells(json_data, (N, M), left_buffer, top_buffer)
+    if not names:
+        raise ValueError("no station falls inside the grid")
+
+    path = None
+    if cache_dir is not None:
+        path = os.path.join(cache_dir, f"{engine}_{operator_key((N, M), rows, cols, engine, engine_kwargs)}.npz")
+        if os.path.exists(path):
+            return names, sparse.load_npz(path)
+
+    operator = build_operator((N, M), rows, cols, engine, **engine_kwargs)
+
+    if path is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp.npz"
+        sparse.save_npz(tmp, operator)
+        os.replace(tmp, path)
+    return names, operator
+
+
+def apply_operator(operator, values, shape, dtype=np.float32):
+    """
+    The 1..5 risk surface for one vector of station values (ordered like the
+    operator's names). NaN marks a station without data: it is left out of
+    every cell's weighted average and the remaining weights are renormalised
+    to the row's full weight, so a cell reached only by missing stations is 0.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    present = ~np.isnan(values)
+    if present.all():
+        surface = operator @ values
+    else:
+        full = operator @ np.ones_like(values)
+        reached = operator @ present.astype(np.float64)
+        surface = np.divide((operator @ np.where(present, values, 0.0)) * full, reached,
+                            out=np.zeros_like(full), where=reached > 0)
+    return rd.rescale_to_range(surface.astype(dtype).reshape(shape))
+
+
+def daily_station_values(names, out_dir="public/data/out"):
+    """
+    Daily risk_class per station from the riskscoring outputs (columnar file
+    when current, else *_risk.json), as a (dates x stations) frame with columns
+    in the order of names. Days a station has no record for are NaN, which
+    apply_operator leaves out; a date recorded more than once keeps its last row.
+    """
+    columns = {}
+    for name in names:
+        dates, risk = risk_history(os.path.join(out_dir, f"{name}_risk.json"))
+        series = pd.Series(risk, index=pd.DatetimeIndex(dates), dtype=np.float64)
+        columns[name] = series.groupby(level=0).last()
+    return pd.DataFrame(columns).sort_index()[names]
+
+
+def daily_surfaces(json_data, N, M, left_buffer, top_buffer, out_dir="public/data/out",
+                   engine="idw", cache_dir=None, **engine_kwargs):
+    """Yield (date, surface) for every day in the *_risk.json history."""
+    names, operator = station_operator(json_data, N, M, left_buffer, top_buffer, engine, cache_dir, **engine_kwargs)
+    daily = daily_station_values(names, out_dir)
+    for date, values in zip(daily.index, daily.to_numpy()):
+        yield date, apply_operator(operator, values, (N, M))
+
+
+def max_operator_error(json_data, N, M, left_buffer, top_buffer, engine="idw", **engine_kwargs):
+    """Largest difference between operator @ values and the engine's own raw surface for the current values."""
+    names, rows, cols = rd.station_cells(json_data, (N, M), left_buffer, top_buffer)
+    values = np.array([json_data[name]['mean_risk'] for name in names], dtype=np.float64)
+    seeded = np.zeros((N, M))
+    seeded[rows, cols] = values
+    reference = rd.INTERPOLATION_ENGINES[engine](seeded, **engine_kwargs)
+    operator = build_operator((N, M), rows, cols, engine, **engine_kwargs)
+    return float(np.abs((operator @ values).reshape(N, M) - reference).max())
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("out_dir", help="where to write one heatmap PNG per day")
+    ap.add_argument("--engine", choices=OPERATOR_ENGINES, default="idw")
+    ap.add_argument("--cache-dir", default=None)
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = ap.parse_args()
+
+    json_data = rd.unpack_json()
+    N, M, left_buffer, top_buffer = rd.grid_layout(json_data)
+    os.makedirs(args.out_dir, exist_ok=True)
+
+    jobs = (
+        dict(matrix=surface, json_data=json_data, left_buffer=left_buffer, top_buffer=top_buffer,
+             title=f"Drought risk {date:%Y-%m-%d}",
+             save_path=os.path.join(args.out_dir, f"heatmap_{date:%Y%m%d}.png"), dpi=100)
+        for date, surface in daily_surfaces(json_data, N, M, left_buffer, top_buffer,
+                                            engine=args.engine, cache_dir=args.cache_dir)
+    )
+    written = rd.render_heatmaps(jobs, workers=args.workers)
+    print(f"{len(written)} daily heatmaps -> {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()